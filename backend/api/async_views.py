@@ -0,0 +1,163 @@
+"""Асинхронные GET-обработчики самых нагруженных эндпоинтов чтения.
+
+Подключаются вместо маршрутов роутера, когда приложение запущено через
+foodgram.asgi (ASYNC_READ_VIEWS). Фильтрация, пагинация, ETag и
+сериализация берутся из тех же вьюсетов, запросы к базе идут через
+асинхронный ORM, а остальные HTTP-методы обрабатывают синхронные вьюсеты.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from api.filters import IngredientSearchFilter
+from api.serializers import UserProfileSerializer
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from recipes.models import Tag
+from recipes.search import ingredient_index
+from recipes.tags import tag_registry
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def render(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status
+    )
+
+
+async def authenticate(request):
+    """TokenAuthentication на асинхронном ORM."""
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return AnonymousUser()
+    if len(auth) == 1:
+        raise exceptions.AuthenticationFailed(
+            _('Invalid token header. No credentials provided.')
+        )
+    if len(auth) > 2:
+        raise exceptions.AuthenticationFailed(
+            _('Invalid token header. Token string should not contain spaces.')
+        )
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(_(
+            'Invalid token header. '
+            'Token string should not contain invalid characters.'
+        ))
+    try:
+        token = await Token.objects.select_related('user').aget(key=key)
+    except Token.DoesNotExist:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    return token.user
+
+
+def async_read_view(viewset, actions):
+    """GET и HEAD обрабатывает корутина, остальные методы — вьюсет.
+
+    Корутина получает экземпляр вьюсета с DRF-запросом, как его
+    получил бы обработчик действия actions['get'].
+    """
+    sync_view = viewset.as_view(actions)
+
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def view(request, **kwargs):
+            if request.method not in READ_METHODS:
+                return await sync_to_async(sync_view)(request, **kwargs)
+            try:
+                drf_request = Request(request)
+                drf_request.user = await authenticate(request)
+                return await handler(viewset(
+                    request=drf_request,
+                    args=(),
+                    kwargs=kwargs,
+                    format_kwarg=None,
+                    action=actions['get']
+                ), drf_request, **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                response = render(
+                    exception_handler(exc, {}).data,
+                    getattr(exc, 'status_code', 404)
+                )
+                if isinstance(exc, exceptions.AuthenticationFailed):
+                    response['WWW-Authenticate'] = 'Token'
+                return response
+
+        # Как у DRF: по ним middleware подписывает логи и метрики.
+        view.cls = viewset
+        view.actions = actions
+        return view
+    return decorator
+
+
+@async_read_view(RecipeViewSet, {'get': 'list', 'post': 'create'})
+async def recipe_list(view, request):
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+    page = await view.paginator.apaginate_queryset(queryset, request, view)
+    data = await view.get_serializer().arepresent(page)
+    return render(view.paginator.get_paginated_response(data).data)
+
+
+@async_read_view(RecipeViewSet, {
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+async def recipe_detail(view, request, pk):
+    recipe = await aget_object_or_404(view.get_queryset(), pk=pk)
+    if request.user.is_authenticated:
+        await UserProfileSerializer.aget_subscribed_author_ids(request)
+    etag, last_modified = view.get_validators(recipe)
+    response = view.get_not_modified(request, etag, last_modified)
+    if response is None:
+        response = render(
+            (await view.get_serializer().arepresent((recipe,)))[0]
+        )
+    return view.patch_validators(response, etag, last_modified)
+
+
+@async_read_view(TagViewSet, {'get': 'list'})
+async def tag_list(view, request):
+    return render(
+        view.get_serializer(await tag_registry.aall(), many=True).data
+    )
+
+
+@async_read_view(TagViewSet, {'get': 'retrieve'})
+async def tag_detail(view, request, pk):
+    for tag in await tag_registry.aall():
+        if tag.pk == pk:
+            return render(view.get_serializer(tag).data)
+    raise Http404(f'No {Tag._meta.object_name} matches the given query.')
+
+
+@async_read_view(IngredientViewSet, {'get': 'list'})
+async def ingredient_list(view, request):
+    ingredients = await ingredient_index.asearch(
+        request.query_params.get(IngredientSearchFilter.search_param, '')
+    )
+    return render(view.get_serializer(ingredients, many=True).data)
+
+
+@async_read_view(IngredientViewSet, {'get': 'retrieve'})
+async def ingredient_detail(view, request, pk):
+    ingredient = await aget_object_or_404(view.get_queryset(), pk=pk)
+    return render(view.get_serializer(ingredient).data)
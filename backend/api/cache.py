@@ -0,0 +1,72 @@
+"""Кеш сериализованных фрагментов рецептов и авторов.
+
+В ключе фрагмента — updated_at объекта, поэтому удалять устаревшие
+фрагменты не нужно: изменение объекта (или связанных с ним тегов,
+ингредиентов и копий картинок, см. api.signals) меняет ключ во всех
+процессах сразу, даже с LocMemCache, а старые записи вытесняются по
+TIMEOUT и MAX_ENTRIES.
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from api.metrics import CACHE_LOOKUPS
+
+RECIPE_FRAGMENT_KEY = 'recipe-fragment:{}:{}'
+USER_FRAGMENT_KEY = 'user-fragment:{}:{}'
+
+
+def get_fragment_key(key_template, obj):
+    return key_template.format(obj.pk, obj.updated_at.timestamp())
+
+
+def get_fragment_keys(key_template, objects):
+    objects = {obj.pk: obj for obj in objects}
+    return objects, {
+        get_fragment_key(key_template, obj): pk
+        for pk, obj in objects.items()
+    }
+
+
+def split_cached(key_template, objects, keys, cached):
+    fragments = {keys[key]: fragment for key, fragment in cached.items()}
+    missing = [obj for pk, obj in objects.items() if pk not in fragments]
+    name = key_template.split(':')[0]
+    CACHE_LOOKUPS.labels(name, 'hit').inc(len(fragments))
+    CACHE_LOOKUPS.labels(name, 'miss').inc(len(missing))
+    return fragments, missing
+
+
+def get_fragments(key_template, objects, build):
+    """Вернуть {pk: фрагмент}, собрав и закешировав недостающие.
+
+    build получает список объектов без фрагмента в кеше
+    и возвращает для них словарь {pk: фрагмент}.
+    """
+    objects, keys = get_fragment_keys(key_template, objects)
+    fragments, missing = split_cached(
+        key_template, objects, keys, cache.get_many(keys)
+    )
+    if missing:
+        built = build(missing)
+        cache.set_many({
+            get_fragment_key(key_template, objects[pk]): fragment
+            for pk, fragment in built.items()
+        })
+        fragments.update(built)
+    return fragments
+
+
+async def aget_fragments(key_template, objects, build):
+    """get_fragments для асинхронных представлений; build синхронный."""
+    objects, keys = get_fragment_keys(key_template, objects)
+    fragments, missing = split_cached(
+        key_template, objects, keys, await cache.aget_many(keys)
+    )
+    if missing:
+        built = await sync_to_async(build)(missing)
+        await cache.aset_many({
+            get_fragment_key(key_template, objects[pk]): fragment
+            for pk, fragment in built.items()
+        })
+        fragments.update(built)
+    return fragments
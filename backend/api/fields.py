@@ -0,0 +1,114 @@
+import base64
+import binascii
+import re
+import uuid
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+from foodgram.constants import (BASE64_CHUNK_SIZE, DATA_URL_HEADER_LIMIT,
+                                ERROR_IMAGE_TOO_LARGE,
+                                ERROR_IMAGE_TOO_MANY_PIXELS, ERROR_IMAGE_TYPE,
+                                ERROR_INVALID_IMAGE, MAX_IMAGE_PIXELS,
+                                MAX_IMAGE_SIZE)
+
+BASE64_MARKER = ';base64,'
+WHITESPACE = re.compile(r'\s+')
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+)
+
+
+def get_image_type(header):
+    """Расширение и MIME-тип по первым байтам файла."""
+    for signature, extension, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension, content_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """Временный файл, который хранилище может перенести на место.
+
+    close() TemporaryUploadedFile не падает на уже перенесённом файле,
+    а финализатор tempfile — падает, поэтому закрываем через close().
+    """
+
+    def __del__(self):
+        self.close()
+
+
+class Base64ImageField(serializers.ImageField):
+    """Картинка в base64 (можно в виде data URL).
+
+    Строка декодируется кусками во временный файл, поэтому в памяти не
+    оказывается вся картинка целиком. Размер проверяется до декодирования,
+    тип — по сигнатуре первых байтов, число пикселей — по заголовку до
+    разбора изображения.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            raise serializers.ValidationError(ERROR_INVALID_IMAGE)
+        start = data.find(BASE64_MARKER, 0, DATA_URL_HEADER_LIMIT)
+        start = 0 if start < 0 else start + len(BASE64_MARKER)
+        if (len(data) - start) // 4 * 3 > MAX_IMAGE_SIZE:
+            raise serializers.ValidationError(ERROR_IMAGE_TOO_LARGE)
+        file = self.decode(data, start)
+        try:
+            try:
+                with Image.open(file) as image:
+                    width, height = image.size
+            except (OSError, Image.DecompressionBombError):
+                raise serializers.ValidationError(ERROR_INVALID_IMAGE)
+            if width * height > MAX_IMAGE_PIXELS:
+                raise serializers.ValidationError(ERROR_IMAGE_TOO_MANY_PIXELS)
+            file.seek(0)
+            return super().to_internal_value(file)
+        except serializers.ValidationError:
+            file.close()
+            raise
+
+    @staticmethod
+    def decode(data, start):
+        file = DecodedImageFile(
+            name=f'{uuid.uuid4()}', content_type=None, size=0, charset=None
+        )
+        size = 0
+        carry = ''
+        image_type = None
+        try:
+            for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+                chunk = carry + WHITESPACE.sub(
+                    '', data[offset:offset + BASE64_CHUNK_SIZE]
+                )
+                cut = len(chunk) - len(chunk) % 4
+                chunk, carry = chunk[:cut], chunk[cut:]
+                decoded = base64.b64decode(chunk, validate=True)
+                if image_type is None and decoded:
+                    image_type = get_image_type(decoded)
+                    if image_type is None:
+                        raise serializers.ValidationError(ERROR_IMAGE_TYPE)
+                size += len(decoded)
+                if size > MAX_IMAGE_SIZE:
+                    raise serializers.ValidationError(ERROR_IMAGE_TOO_LARGE)
+                file.write(decoded)
+            if carry or image_type is None:
+                raise serializers.ValidationError(ERROR_INVALID_IMAGE)
+        except binascii.Error:
+            file.close()
+            raise serializers.ValidationError(ERROR_INVALID_IMAGE)
+        except serializers.ValidationError:
+            file.close()
+            raise
+        extension, file.content_type = image_type
+        file.name = f'{file.name}.{extension}'
+        file.size = size
+        file.seek(0)
+        return file
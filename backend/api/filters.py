@@ -1,7 +1,14 @@
+from django.db.models import F
 from django_filters import rest_framework
 from rest_framework import filters
 
-from recipes.models import Recipie, Tag
+from recipes.models import Recipie
+from recipes.search import ingredient_index
+from recipes.tags import tag_registry
+
+
+def get_tag_choices():
+    return tag_registry.choices()
 
 
 class RecipeFilter(rest_framework.FilterSet):
@@ -11,30 +18,37 @@ class RecipeFilter(rest_framework.FilterSet):
     is_in_shopping_cart = rest_framework.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
-    tags = rest_framework.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-        conjoined=False,
+    tags = rest_framework.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags',
     )
 
     class Meta:
         model = Recipie
         fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags')
 
+    def filter_tags(self, queryset, name, value):
+        return queryset.alias(
+            matched_tags=F('tags_mask').bitand(tag_registry.get_mask(value))
+        ).exclude(matched_tags=0)
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shoppingcart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
 
 class IngredientSearchFilter(filters.SearchFilter):
     search_param = 'name'
 
-    def get_search_fields(self, view, request):
-        return ('name',)
+    def filter_queryset(self, request, queryset, view):
+        if getattr(view, 'action', None) != 'list':
+            return queryset
+        return ingredient_index.search(
+            request.query_params.get(self.search_param, '')
+        )
@@ -0,0 +1,56 @@
+"""Метрики Prometheus.
+
+Под gunicorn задайте PROMETHEUS_MULTIPROC_DIR (это делает
+gunicorn.conf.py): каждый воркер пишет значения в свои файлы в этом
+каталоге, а /metrics складывает файлы всех воркеров.
+"""
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+from foodgram.constants import METRICS_DB_QUERY_BUCKETS
+
+REQUESTS = Counter(
+    'foodgram_http_requests_total',
+    'Обработанные HTTP-запросы.',
+    ('endpoint', 'method', 'status')
+)
+REQUEST_LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки HTTP-запроса.',
+    ('endpoint', 'method')
+)
+IN_FLIGHT = Gauge(
+    'foodgram_http_requests_in_flight',
+    'Запросы, которые обрабатываются сейчас.',
+    ('endpoint',),
+    multiprocess_mode='livesum'
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Число SQL-запросов на HTTP-запрос.',
+    ('endpoint',),
+    buckets=METRICS_DB_QUERY_BUCKETS
+)
+DB_TIME = Histogram(
+    'foodgram_db_duration_seconds',
+    'Суммарное время SQL-запросов HTTP-запроса.',
+    ('endpoint',)
+)
+CACHE_LOOKUPS = Counter(
+    'foodgram_cache_lookups_total',
+    'Обращения к кешу фрагментов; доля попаданий — hit / (hit + miss).',
+    ('cache', 'result')
+)
+
+
+def render_metrics():
+    """Текст метрик и его Content-Type."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
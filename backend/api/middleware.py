@@ -0,0 +1,276 @@
+"""Замеры запроса: число и время SQL, время представления и рендеринга.
+
+Итоги отдаются заголовком Server-Timing и одной строкой лога в JSON;
+если запрос дольше SLOW_REQUEST_THRESHOLD мс, в лог попадают самые
+долгие SQL-запросы. Обёртка SQL ставится на каждое соединение один раз
+и пишет в метрики текущего запроса через contextvars, поэтому работает
+и в потоках sync_to_async. PrometheusMiddleware копит те же замеры
+в метриках для /metrics.
+"""
+import heapq
+import json
+import logging
+import time
+from contextvars import ContextVar
+from types import MethodType
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from api.metrics import (DB_QUERIES, DB_TIME, IN_FLIGHT, REQUEST_LATENCY,
+                         REQUESTS)
+from foodgram.constants import (SLOW_REQUEST_SQL_LENGTH,
+                                SLOW_REQUEST_TOP_QUERIES)
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ENDPOINT = 'unmatched'
+
+_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = (
+        'started', 'view_started', 'view_finished', 'queries', 'sql_time',
+        'slowest', 'view_sql_time', 'endpoint'
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = self.view_finished = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.view_sql_time = None
+        self.slowest = []
+        self.endpoint = UNMATCHED_ENDPOINT
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        entry = (duration, self.queries, sql)
+        if len(self.slowest) < SLOW_REQUEST_TOP_QUERIES:
+            heapq.heappush(self.slowest, entry)
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def install_wrapper(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    install_wrapper(connection)
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2)
+
+
+def get_endpoint(request, view_func):
+    """Имя для логов и меток метрик: RecipeViewSet.list, short_link_redirect.
+
+    Число значений ограничено числом представлений, в отличие от пути.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return view_func.__name__
+    action = (getattr(view_func, 'actions', None) or {}).get(
+        request.method.lower()
+    )
+    return (
+        f'{view_class.__name__}.{action}' if action
+        else view_class.__name__
+    )
+
+
+class HybridMiddleware:
+    """Основа middleware, работающих и под WSGI, и под ASGI.
+
+    Подклассы задают before(request), release(request, state) — в finally
+    — и after(request, response, state). Под ASGI синхронные хуки
+    оборачиваются корутинами: они ничего не ждут, а иначе Django вызывал
+    бы их через sync_to_async с переходом в поток на каждом запросе.
+    """
+
+    sync_capable = True
+    async_capable = True
+    hooks = ('process_view', 'process_template_response')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            for name in self.hooks:
+                if hasattr(self, name):
+                    setattr(self, name, self.as_coroutine(getattr(self, name)))
+
+    def as_coroutine(self, hook):
+        # Связанный метод: Django берёт из хука __self__ для сообщений.
+        async def coroutine(middleware, *args):
+            return hook(*args)
+        return MethodType(coroutine, self)
+
+    def before(self, request):
+        return None
+
+    def release(self, request, state):
+        pass
+
+    def after(self, request, response, state):
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.before(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.release(request, state)
+        return self.after(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.before(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.release(request, state)
+        return self.after(request, response, state)
+
+
+class ServerTimingMiddleware(HybridMiddleware):
+    """Ставить первым в MIDDLEWARE, чтобы замер охватывал весь запрос."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        for connection in connections.all():
+            install_wrapper(connection)
+
+    def before(self, request):
+        metrics = RequestMetrics()
+        return metrics, _metrics.set(metrics)
+
+    def release(self, request, state):
+        _metrics.reset(state[1])
+
+    def after(self, request, response, state):
+        self.report(request, response, state[0])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _metrics.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+            metrics.endpoint = get_endpoint(request, view_func)
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после этого вызова: всё до него —
+        # работа представления и сериализаторов.
+        metrics = _metrics.get()
+        if metrics is not None:
+            metrics.view_finished = time.perf_counter()
+            metrics.view_sql_time = metrics.sql_time
+        return response
+
+    def report(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        if metrics.view_started and not metrics.view_finished:
+            # Ответ без рендеринга (HttpResponse, редирект): всё время
+            # после process_view — работа представления.
+            metrics.view_finished = time.perf_counter()
+            metrics.view_sql_time = metrics.sql_time
+        timings = [('db', metrics.sql_time)]
+        if metrics.view_started and metrics.view_finished:
+            timings.append((
+                'serializer',
+                metrics.view_finished - metrics.view_started
+                - metrics.view_sql_time
+            ))
+            timings.append((
+                'render',
+                time.perf_counter() - metrics.view_finished
+                - (metrics.sql_time - metrics.view_sql_time)
+            ))
+        timings.append(('total', total))
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={milliseconds(duration)}'
+                for name, duration in timings
+            ) + f', queries;desc="{metrics.queries}"'
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': metrics.endpoint,
+            'queries': metrics.queries,
+            **{
+                f'{name}_ms': milliseconds(duration)
+                for name, duration in timings
+            },
+        }
+        slow = total * 1000 >= settings.SLOW_REQUEST_THRESHOLD
+        if slow:
+            record['slowest_queries'] = [
+                {
+                    'ms': milliseconds(duration),
+                    'sql': sql[:SLOW_REQUEST_SQL_LENGTH],
+                }
+                for duration, _, sql in sorted(metrics.slowest, reverse=True)
+            ]
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            json.dumps(record, ensure_ascii=False)
+        )
+
+
+class PrometheusMiddleware(HybridMiddleware):
+    """Счётчики и гистограммы по представлениям для /metrics.
+
+    Ставить сразу после ServerTimingMiddleware: метрики SQL берутся из
+    его замеров.
+    """
+
+    def before(self, request):
+        request._in_flight = None
+        return time.perf_counter()
+
+    def release(self, request, started):
+        if request._in_flight is not None:
+            request._in_flight.dec()
+
+    def after(self, request, response, started):
+        metrics = _metrics.get()
+        endpoint = metrics.endpoint if metrics else UNMATCHED_ENDPOINT
+        REQUESTS.labels(
+            endpoint, request.method, response.status_code
+        ).inc()
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(
+            time.perf_counter() - started
+        )
+        if metrics is not None:
+            DB_QUERIES.labels(endpoint).observe(metrics.queries)
+            DB_TIME.labels(endpoint).observe(metrics.sql_time)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._in_flight = IN_FLIGHT.labels(
+            get_endpoint(request, view_func)
+        )
+        request._in_flight.inc()
@@ -0,0 +1,133 @@
+import hashlib
+from calendar import timegm
+
+from django.db import transaction
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.serializers import BulkIdsSerializer
+from foodgram.constants import ERROR_RELATION_EXISTS, ERROR_RELATION_NOT_FOUND
+from recipes.services import insert_or_ignore_many
+
+
+class ConditionalRetrieveMixin:
+    """Отвечает 304 на условный GET до сериализации объекта.
+
+    ETag учитывает флаги текущего пользователя, а у них нет даты
+    изменения, поэтому If-Modified-Since проверяется только для
+    анонимных запросов.
+    """
+
+    def get_etag_parts(self, instance):
+        return (instance.pk, instance.updated_at.isoformat())
+
+    def get_last_modified(self, instance):
+        return instance.updated_at
+
+    def get_validators(self, instance):
+        """ETag и Last-Modified (в секундах) объекта."""
+        etag = quote_etag(hashlib.md5(
+            ':'.join(map(str, self.get_etag_parts(instance))).encode()
+        ).hexdigest())
+        return etag, timegm(self.get_last_modified(instance).utctimetuple())
+
+    def get_not_modified(self, request, etag, last_modified):
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=(
+                None if request.user.is_authenticated else last_modified
+            )
+        )
+
+    def patch_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def conditional_retrieve(self, request, instance):
+        etag, last_modified = self.get_validators(instance)
+        response = self.get_not_modified(request, etag, last_modified)
+        if response is None:
+            response = Response(
+                self.get_serializer(instance).data
+            )
+        return self.patch_validators(response, etag, last_modified)
+
+
+class BulkRelationMixin:
+    """Массовое добавление и удаление связей текущего пользователя.
+
+    Связь — модель с полями user и field (recipe, author); ids объектов
+    передаются в теле запроса, результат возвращается по каждому id.
+    """
+
+    def get_bulk_ids(self):
+        serializer = BulkIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['ids']))
+
+    def get_relation_ids(self, model, field, ids):
+        return set(model.objects.filter(
+            user=self.request.user, **{f'{field}_id__in': ids}
+        ).values_list(f'{field}_id', flat=True))
+
+    def insert_relations(self, model, field, ids):
+        """Добавить связи, пропуская существующие; вернуть ids добавленных."""
+        return [pk for _, pk in insert_or_ignore_many(
+            model, ('user_id', f'{field}_id'),
+            ((self.request.user.pk, pk) for pk in ids)
+        )]
+
+    @transaction.atomic
+    def bulk_create_relations(self, model, field, target_model,
+                              not_found_error, errors=None, insert=None):
+        """insert(ids) заменяет insert_relations, если при добавлении
+        нужно что-то ещё (например, пересчитать итоги корзины)."""
+        ids = self.get_bulk_ids()
+        errors = dict(errors or {})
+        found = set(target_model.objects.filter(
+            pk__in=ids
+        ).values_list('pk', flat=True))
+        for pk in ids:
+            if pk not in found:
+                errors[pk] = not_found_error
+        # Существующие связи определяет сам INSERT: проверка заранее
+        # не спасла бы от параллельного запроса.
+        candidates = [pk for pk in ids if pk not in errors]
+        inserted = set(
+            insert(candidates) if insert
+            else self.insert_relations(model, field, candidates)
+        )
+        exists_error = ERROR_RELATION_EXISTS.format(model._meta.verbose_name)
+        results = []
+        for pk in ids:
+            error = errors.get(pk) or (
+                None if pk in inserted else exists_error
+            )
+            results.append(
+                {'id': pk, 'status': 'error', 'error': error} if error
+                else {'id': pk, 'status': 'created'}
+            )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @transaction.atomic
+    def bulk_delete_relations(self, model, field):
+        ids = self.get_bulk_ids()
+        existing = self.get_relation_ids(model, field, ids)
+        model.objects.filter(
+            user=self.request.user, **{f'{field}_id__in': existing}
+        ).delete()
+        not_found_error = ERROR_RELATION_NOT_FOUND.format(
+            model._meta.verbose_name
+        )
+        return Response({'results': [
+            {'id': pk, 'status': 'deleted'} if pk in existing
+            else {'id': pk, 'status': 'error', 'error': not_found_error}
+            for pk in ids
+        ]}, status=status.HTTP_200_OK)
@@ -1,7 +1,232 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
 
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class PageNumberPagination(PageNumberPagination):
+from foodgram.constants import ERROR_INVALID_CURSOR
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных представлений."""
+        self.request = request
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        # count — cached_property: считаем заранее, чтобы page() не ходил
+        # в базу синхронно.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.page.object_list = [
+            obj async for obj in self.page.object_list
+        ]
+        return self.page.object_list
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Пагинация по ключу сортировки вместо COUNT(*) и OFFSET.
+
+    Курсор — непрозрачный токен со значениями полей ordering
+    последней (или первой) записи страницы.
+    """
+
+    cursor_query_param = 'cursor'
     page_size_query_param = 'limit'
     page_size = 6
     max_page_size = 100
+    ordering = ('-pub_date', '-id')
+
+    def get_page_size(self, request):
+        try:
+            return pagination._positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    @staticmethod
+    def encode_cursor(position, reverse):
+        token = json.dumps({'p': position, 'r': int(reverse)})
+        return urlsafe_b64encode(token.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            token = json.loads(urlsafe_b64decode(encoded.encode()))
+            position, reverse = token['p'], bool(token['r'])
+            if (
+                not isinstance(position, list)
+                or len(position) != len(self.ordering)
+            ):
+                raise ValueError
+            # Значения курсора попадают в фильтр: проверяем их полями
+            # сортировки (тип и диапазон), чтобы подделанный курсор не
+            # дал 500.
+            position = [
+                self.clean_value(model, field, value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (
+            BinasciiError, ValidationError, ValueError, TypeError, KeyError
+        ):
+            raise NotFound(ERROR_INVALID_CURSOR)
+        return position, reverse
+
+    @staticmethod
+    def clean_value(model, field, value):
+        if value is None:
+            raise ValueError
+        return model._meta.get_field(field.lstrip('-')).clean(value, None)
+
+    def get_ordering(self, reverse):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def get_keyset_filter(self, position, reverse):
+        condition, equal = Q(), Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_position(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def get_page_queryset(self, queryset, request):
+        """Запрос страницы с одной лишней записью: есть ли следующая."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(
+            request, queryset.model
+        )
+        if self.position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(self.position, self.reverse)
+            )
+        return queryset.order_by(
+            *self.get_ordering(self.reverse)
+        )[:self.page_size + 1]
+
+    def set_page(self, page):
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        has_cursor = self.position is not None
+        if self.reverse:
+            page.reverse()
+            self.has_next, self.has_previous = has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, has_cursor
+        self.page = page
+        return page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(
+            list(self.get_page_queryset(queryset, request))
+        )
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([
+            obj async for obj in self.get_page_queryset(queryset, request)
+        ])
+
+    def get_link(self, instance, reverse):
+        url = self.request.build_absolute_uri()
+        if instance is None:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.get_position(instance), reverse)
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.get_link(self.page[-1] if self.page else None, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.get_link(self.page[0] if self.page else None, True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering = ('last_name', 'id')
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """Постраничная пагинация с переходом в keyset-режим по ?cursor=.
+
+    Для первой страницы в keyset-режиме передаётся пустой cursor.
+    """
+
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_paginator = None
+        cursor_param = self.keyset_pagination_class.cursor_query_param
+        if cursor_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset_paginator = self.keyset_pagination_class()
+        return self.keyset_paginator.paginate_queryset(
+            queryset, request, view
+        )
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.keyset_paginator = None
+        cursor_param = self.keyset_pagination_class.cursor_query_param
+        if cursor_param not in request.query_params:
+            return await super().apaginate_queryset(queryset, request, view)
+        self.keyset_paginator = self.keyset_pagination_class()
+        return await self.keyset_paginator.apaginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is None:
+            return super().get_paginated_response(data)
+        return self.keyset_paginator.get_paginated_response(data)
+
+
+class UserPagination(PageNumberOrKeysetPagination):
+    keyset_pagination_class = UserKeysetPagination
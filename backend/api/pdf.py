@@ -0,0 +1,228 @@
+import hashlib
+import re
+import zlib
+from functools import lru_cache
+from io import BytesIO
+from itertools import islice
+from pathlib import Path
+
+from fontTools import subset
+from fontTools.ttLib import TTFont
+from PIL import ImageFont
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 12
+LEADING = 16
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+ENCODING = 'cp1251'
+FIRST_CHAR = 32
+LAST_CHAR = 255
+SUBSET_CACHE_SIZE = 64
+
+
+def decode_char(code):
+    try:
+        return bytes((code,)).decode(ENCODING)
+    except UnicodeDecodeError:
+        return None
+
+
+def get_differences():
+    """Имена глифов для кодов cp1251 вне ASCII, чтобы работала кириллица."""
+    return ' '.join(
+        f'{code} /uni{ord(char):04X}'
+        for code, char in (
+            (code, decode_char(code)) for code in range(128, 256)
+        )
+        if char is not None
+    ).encode()
+
+
+@lru_cache
+def load_font(path):
+    """Ширины глифов и метрики TrueType-шрифта."""
+    if not path or not Path(path).is_file():
+        return None
+    font = ImageFont.truetype(path, 1000)
+    widths = []
+    for code in range(FIRST_CHAR, LAST_CHAR + 1):
+        char = decode_char(code)
+        widths.append(round(font.getlength(char)) if char else 0)
+    ascent, descent = font.getmetrics()
+    name = re.sub(r'[^A-Za-z0-9-]', '', Path(path).stem) or 'Font'
+    return name, widths, ascent, descent
+
+
+@lru_cache(maxsize=SUBSET_CACHE_SIZE)
+def subset_font(path, chars):
+    """Сжатый шрифт только с глифами chars и его тег подмножества.
+
+    Целиком DejaVuSans весит сотни килобайт, а списку покупок
+    обычно нужно меньше сотни символов.
+    """
+    font = TTFont(path)
+    options = subset.Options()
+    options.layout_features = []
+    options.hinting = False
+    options.drop_tables += ['FFTM']
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=map(ord, chars))
+    subsetter.subset(font)
+    buffer = BytesIO()
+    font.save(buffer)
+    data = buffer.getvalue()
+    tag = ''.join(
+        chr(ord('A') + byte % 26)
+        for byte in hashlib.md5(''.join(chars).encode()).digest()[:6]
+    )
+    return tag, len(data), zlib.compress(data)
+
+
+def escape(data):
+    return (
+        data.replace(b'\\', b'\\\\')
+        .replace(b'(', b'\\(')
+        .replace(b')', b'\\)')
+    )
+
+
+class PDFWriter:
+    """Пишет объекты PDF по мере готовности, запоминая их смещения."""
+
+    def __init__(self):
+        self.offsets = {}
+        self.position = 0
+        self.last_number = 0
+
+    def reserve(self):
+        self.last_number += 1
+        return self.last_number
+
+    def write(self, data):
+        self.position += len(data)
+        return data
+
+    def object(self, number, body, stream=None):
+        self.offsets[number] = self.position
+        chunk = b'%d 0 obj\n' % number + body
+        if stream is not None:
+            chunk += b'\nstream\n' + stream + b'\nendstream'
+        return self.write(chunk + b'\nendobj\n')
+
+    def font_objects(self, font_number, font_path, codes):
+        encoding = (
+            b'<< /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            b'/Differences [' + get_differences() + b'] >>'
+        )
+        font = load_font(font_path)
+        if font is None:
+            yield self.object(
+                font_number,
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                b'/Encoding ' + encoding + b' >>'
+            )
+            return
+        name, widths, ascent, descent = font
+        tag, length, data = subset_font(font_path, tuple(sorted(
+            char for char in map(decode_char, codes) if char
+        )))
+        name = f'{tag}+{name}'
+        descriptor_number, file_number = self.reserve(), self.reserve()
+        yield self.object(
+            font_number,
+            b'<< /Type /Font /Subtype /TrueType /BaseFont /%s '
+            b'/FirstChar %d /LastChar %d /Widths [%s] '
+            b'/FontDescriptor %d 0 R /Encoding %s >>' % (
+                name.encode(), FIRST_CHAR, LAST_CHAR,
+                ' '.join(map(str, widths)).encode(),
+                descriptor_number, encoding
+            )
+        )
+        yield self.object(
+            descriptor_number,
+            b'<< /Type /FontDescriptor /FontName /%s /Flags 32 '
+            b'/FontBBox [0 %d 1000 %d] /ItalicAngle 0 /Ascent %d '
+            b'/Descent %d /CapHeight %d /StemV 80 /FontFile2 %d 0 R >>' % (
+                name.encode(), -descent, ascent, ascent, -descent, ascent,
+                file_number
+            )
+        )
+        yield self.object(
+            file_number,
+            b'<< /Length %d /Length1 %d /Filter /FlateDecode >>' % (
+                len(data), length
+            ),
+            data
+        )
+
+    def page_objects(self, font_number, pages_number, lines):
+        lines = [line.encode(ENCODING, errors='replace') for line in lines]
+        for line in lines:
+            self.codes.update(line)
+        content = b''.join(
+            b'(' + escape(line) + b') Tj T*\n' for line in lines
+        )
+        content = zlib.compress(
+            b'BT /F1 %d Tf %d TL %d %d Td\n' % (
+                FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN - FONT_SIZE
+            ) + content + b'ET'
+        )
+        content_number, page_number = self.reserve(), self.reserve()
+        yield self.object(
+            content_number,
+            b'<< /Length %d /Filter /FlateDecode >>' % len(content),
+            content
+        )
+        yield self.object(
+            page_number,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>' % (
+                pages_number, PAGE_WIDTH, PAGE_HEIGHT, font_number,
+                content_number
+            )
+        )
+        self.kids.append(page_number)
+
+    def stream(self, lines, font_path=None):
+        """Отдать PDF по частям: в памяти держится одна страница строк.
+
+        Шрифт пишется после страниц: в него попадают только глифы
+        символов, которые встретились в тексте.
+        """
+        self.kids = []
+        self.codes = set()
+        catalog_number, pages_number = self.reserve(), self.reserve()
+        font_number = self.reserve()
+        yield self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self.object(
+            catalog_number,
+            b'<< /Type /Catalog /Pages %d 0 R >>' % pages_number
+        )
+        lines = iter(lines)
+        while True:
+            page = list(islice(lines, LINES_PER_PAGE))
+            if not page and self.kids:
+                break
+            yield from self.page_objects(font_number, pages_number, page)
+        yield from self.font_objects(font_number, font_path, self.codes)
+        yield self.object(
+            pages_number,
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                b' '.join(b'%d 0 R' % kid for kid in self.kids),
+                len(self.kids)
+            )
+        )
+        xref_position = self.position
+        yield self.write(
+            b'xref\n0 %d\n0000000000 65535 f \n' % (self.last_number + 1)
+            + b''.join(
+                b'%010d 00000 n \n' % self.offsets[number]
+                for number in range(1, self.last_number + 1)
+            )
+            + b'trailer\n<< /Size %d /Root %d 0 R >>\n' % (
+                self.last_number + 1, catalog_number
+            )
+            + b'startxref\n%d\n%%%%EOF\n' % xref_position
+        )
@@ -1,3 +1,6 @@
+import ipaddress
+
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -13,3 +16,19 @@ class OwnerOrReadOnly(permissions.BasePermission):
             request.method in permissions.SAFE_METHODS
             or obj.author == request.user
         )
+
+
+class StaffOrInternalNetwork(permissions.BasePermission):
+    """Администраторы или адреса из METRICS_ALLOWED_NETWORKS."""
+
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        try:
+            address = ipaddress.ip_address(request.META.get('REMOTE_ADDR'))
+        except ValueError:
+            return False
+        return any(
+            address in ipaddress.ip_network(network, strict=False)
+            for network in settings.METRICS_ALLOWED_NETWORKS
+        )
@@ -0,0 +1,97 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import renderers
+
+from api.pdf import PDFWriter
+from foodgram.constants import SHOPPING_LIST_CHUNK_SIZE
+
+
+async def astream(chunks, size=SHOPPING_LIST_CHUNK_SIZE):
+    """Асинхронная обёртка над синхронным stream() для ASGI.
+
+    Иначе Django под ASGI читает синхронный итератор в список целиком.
+    Части (и запросы к базе за ними) берутся пачками в синхронном
+    потоке запроса.
+    """
+    take = sync_to_async(lambda: list(islice(chunks, size)))
+    while batch := await take():
+        yield b''.join(batch)
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанное."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Отдаёт список покупок по частям через stream().
+
+    items — итерируемый набор (название, единица измерения, количество),
+    по умолчанию отдаётся строками текста. Ошибки рендерит JSONRenderer
+    (см. RecipeViewSet.handle_exception).
+    """
+
+    charset = 'utf-8'
+
+    @staticmethod
+    def format_line(name, measurement_unit, amount):
+        return f'{name} ({measurement_unit}) - {amount}'
+
+    def stream(self, items):
+        for item in items:
+            yield f'{self.format_line(*item)}\n'.encode()
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        ).encode()
+        for item in items:
+            yield writer.writerow(item).encode()
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, items):
+        separator = b'['
+        for name, measurement_unit, amount in items:
+            yield separator + json.dumps(
+                {
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                    'amount': amount,
+                },
+                ensure_ascii=False
+            ).encode()
+            separator = b','
+        yield b'[]' if separator == b'[' else b']'
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, items):
+        lines = (self.format_line(*item) for item in items)
+        return PDFWriter().stream(
+            lines, font_path=settings.SHOPPING_LIST_PDF_FONT
+        )
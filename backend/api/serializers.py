@@ -1,23 +1,37 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from api.cache import (RECIPE_FRAGMENT_KEY, USER_FRAGMENT_KEY, aget_fragments,
+                       get_fragments)
+from api.fields import Base64ImageField
 from foodgram.constants import (ERROR_ALREADY_SUBSCRIBED,
                                 ERROR_DUBLICATE_INGREDIENT,
                                 ERROR_DUBLICATE_TAG, ERROR_EMPTY_INGREDIENT,
                                 ERROR_EMPTY_TAG, ERROR_NO_IMAGE,
                                 ERROR_NO_INGREDIENT, ERROR_NO_TAG,
-                                ERROR_SELF_SUBSCRIPTION, MAX_INGREDIENT_AMOUNT,
+                                ERROR_RELATION_EXISTS, ERROR_SELF_SUBSCRIPTION,
+                                MAX_BULK_IDS, MAX_INGREDIENT_AMOUNT,
                                 MIN_INGREDIENT_AMOUNT)
+from recipes.images import get_derivative_url, get_image_url
 from recipes.models import (Favorite, Ingredient, RecipeIngredient, Recipie,
                             ShoppingCart, Tag)
+from recipes.services import insert_or_ignore, update_recipe_cart_totals
+from recipes.tags import tag_registry
 from users.models import Subscription
 
 User = get_user_model()
 
 
+def raise_non_field_error(message):
+    raise serializers.ValidationError(
+        {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+    )
+
+
 class ImageField(Base64ImageField):
     def to_internal_value(self, data):
         if data == "":
@@ -35,17 +49,70 @@ class UserSignUpSerializer(UserCreateSerializer):
 class UserProfileSerializer(UserSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar = serializers.SerializerMethodField()
+    avatar_thumbnail = serializers.SerializerMethodField()
+    avatar_thumbnail_webp = serializers.SerializerMethodField()
+    # Поля с URL, которые RecipeSerializer.compose делает абсолютными.
+    image_fields = ('avatar', 'avatar_thumbnail', 'avatar_thumbnail_webp')
 
     class Meta(UserSerializer.Meta):
         model = User
-        fields = UserSerializer.Meta.fields + ('is_subscribed', 'avatar')
+        fields = UserSerializer.Meta.fields + (
+            'is_subscribed', 'avatar', 'avatar_thumbnail',
+            'avatar_thumbnail_webp',
+        )
+
+    @staticmethod
+    def get_subscribed_author_ids(request):
+        if not hasattr(request, '_subscribed_author_ids'):
+            request._subscribed_author_ids = set(
+                request.user.user_subscriptions.values_list(
+                    'author_id', flat=True
+                )
+            )
+        return request._subscribed_author_ids
+
+    @staticmethod
+    async def aget_subscribed_author_ids(request):
+        if not hasattr(request, '_subscribed_author_ids'):
+            request._subscribed_author_ids = {
+                author_id async for author_id in
+                request.user.user_subscriptions.values_list(
+                    'author_id', flat=True
+                )
+            }
+        return request._subscribed_author_ids
+
+    @classmethod
+    def is_subscribed_to(cls, request, author_id):
+        if (
+            not request
+            or not request.user.is_authenticated
+            or request.user.pk == author_id
+        ):
+            return False
+        return author_id in cls.get_subscribed_author_ids(request)
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and request.user.user_subscriptions.filter(author=obj).exists()
+        return self.is_subscribed_to(self.context.get('request'), obj.pk)
+
+    def get_avatar(self, obj):
+        return build_absolute_uri(
+            self.context.get('request'), obj.avatar.url if obj.avatar else None
+        )
+
+    def get_avatar_thumbnail(self, obj):
+        return build_absolute_uri(
+            self.context.get('request'), get_image_url(
+                obj.avatar, obj.avatar_derivatives, 'thumb'
+            )
+        )
+
+    def get_avatar_thumbnail_webp(self, obj):
+        return build_absolute_uri(
+            self.context.get('request'), get_derivative_url(
+                obj.avatar, obj.avatar_derivatives, 'thumb', 'WEBP'
+            )
         )
 
 
@@ -61,21 +128,22 @@ class UserProfileListRecipesSerilizer(UserProfileSerializer):
             'recipes', 'recipes_count',
         )
 
+    @staticmethod
+    def get_recipes_limit(request):
+        if not request:
+            return None
+        try:
+            recipes_limit = int(request.query_params.get('recipes_limit'))
+        except (ValueError, TypeError):
+            return None
+        return recipes_limit if recipes_limit > 0 else None
+
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = None
-        if request:
-            recipes_limit = (
-                self.context
-                .get('request')
-                .query_params.get('recipes_limit')
-            )
+        recipes_limit = self.get_recipes_limit(self.context.get('request'))
+        # Served from the prefetch cache on the subscriptions page.
         recipes = obj.recipes.all()
         if recipes_limit:
-            try:
-                recipes = recipes[:int(recipes_limit)]
-            except (ValueError, TypeError):
-                pass
+            recipes = recipes[:recipes_limit]
         return FavoriteRecipeSerializer(recipes,
                                         many=True,
                                         context=self.context).data
@@ -140,12 +208,75 @@ class CreateRecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """Не зависящая от пользователя часть RecipeSerializer для кеша."""
+
+    image = serializers.SerializerMethodField()
+    image_webp = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
+    ingredients = RecipeIngredientSerializer(
+        many=True,
+        source='recipe_ingredients'
+    )
+
+    class Meta:
+        model = Recipie
+        fields = (
+            'id', 'tags', 'name', 'image', 'image_webp', 'text',
+            'cooking_time', 'ingredients',
+        )
+
+    def get_image(self, obj):
+        return get_image_url(obj.image, obj.image_derivatives, 'card')
+
+    def get_image_webp(self, obj):
+        return get_derivative_url(
+            obj.image, obj.image_derivatives, 'card', 'WEBP'
+        )
+
+    def get_tags(self, obj):
+        return TagSerializer(
+            tag_registry.from_mask(obj.tags_mask), many=True
+        ).data
+
+
+def build_recipe_fragments(recipes):
+    prefetch_related_objects(recipes, 'recipe_ingredients__ingredient')
+    return {
+        recipe.pk: RecipeFragmentSerializer(recipe).data
+        for recipe in recipes
+    }
+
+
+def build_user_fragments(users):
+    return {user.pk: UserProfileSerializer(user).data for user in users}
+
+
+def build_absolute_uri(request, url):
+    if not url or not request:
+        return url
+    return request.build_absolute_uri(url)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        return self.child.represent(list(data))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     image = ImageField(required=True)
+    image_webp = serializers.URLField(read_only=True, allow_null=True)
     author = UserProfileSerializer(read_only=True)
     tags = TagSerializer(many=True)
-    is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
-    is_favorited = serializers.SerializerMethodField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(
+        read_only=True,
+        default=False
+    )
+    is_favorited = serializers.BooleanField(
+        read_only=True,
+        default=False
+    )
     ingredients = RecipeIngredientSerializer(
         many=True,
         source='recipe_ingredients'
@@ -155,27 +286,76 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipie
         fields = (
             'id', 'tags', 'author',
-            'name', 'image', 'text', 'cooking_time',
+            'name', 'image', 'image_webp', 'text', 'cooking_time',
             'is_in_shopping_cart', 'is_favorited',
             'ingredients',
         )
+        list_serializer_class = RecipeListSerializer
 
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and request.user.shoppingcart_set.filter(recipe=obj).exists()
+    def to_representation(self, instance):
+        return self.represent((instance,))[0]
+
+    def represent(self, recipes):
+        """Собрать рецепты из кешированных фрагментов.
+
+        Поверх фрагментов накладываются абсолютные URL и флаги
+        текущего пользователя, поэтому вложенные сериализаторы
+        запускаются только для рецептов, которых нет в кеше.
+        """
+        return self.compose(
+            recipes,
+            get_fragments(
+                RECIPE_FRAGMENT_KEY, recipes, build_recipe_fragments
+            ),
+            get_fragments(
+                USER_FRAGMENT_KEY,
+                (recipe.author for recipe in recipes),
+                build_user_fragments
+            )
         )
 
-    def get_is_favorited(self, obj):
+    async def arepresent(self, recipes):
+        """represent для асинхронных представлений."""
         request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and request.user.favorite_set.filter(recipe=obj).exists()
+        if request and request.user.is_authenticated:
+            await UserProfileSerializer.aget_subscribed_author_ids(request)
+        return self.compose(
+            recipes,
+            await aget_fragments(
+                RECIPE_FRAGMENT_KEY, recipes, build_recipe_fragments
+            ),
+            await aget_fragments(
+                USER_FRAGMENT_KEY,
+                (recipe.author for recipe in recipes),
+                build_user_fragments
+            )
         )
 
+    def compose(self, recipes, recipe_fragments, author_fragments):
+        request = self.context.get('request')
+        representations = []
+        for recipe in recipes:
+            author = dict(author_fragments[recipe.author_id])
+            for field in UserProfileSerializer.image_fields:
+                author[field] = build_absolute_uri(request, author[field])
+            author['is_subscribed'] = UserProfileSerializer.is_subscribed_to(
+                request, recipe.author_id
+            )
+            data = dict(
+                recipe_fragments[recipe.pk],
+                author=author,
+                is_favorited=getattr(recipe, 'is_favorited', False),
+                is_in_shopping_cart=getattr(
+                    recipe, 'is_in_shopping_cart', False
+                )
+            )
+            for field in ('image', 'image_webp'):
+                data[field] = build_absolute_uri(request, data[field])
+            representations.append(
+                {field: data[field] for field in self.Meta.fields}
+            )
+        return representations
+
 
 class CreateRecipeSerializer(RecipeSerializer):
     tags = serializers.PrimaryKeyRelatedField(
@@ -234,14 +414,46 @@ class CreateRecipeSerializer(RecipeSerializer):
         self.create_recipe_ingredients(recipe, ingredients)
         return recipe
 
+    @classmethod
+    def update_recipe_ingredients(cls, recipe, ingredients):
+        """Записать только отличия от текущего состава рецепта."""
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        new_amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=removed
+            ).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        cls.create_recipe_ingredients(recipe, (
+            ingredient for ingredient in ingredients
+            if ingredient['id'].pk not in current
+        ))
+        update_recipe_cart_totals(recipe.pk, old_amounts, new_amounts)
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients', None)
-        tags = validated_data.pop('tags', None)
-        instance.save()
-        instance.tags.set(tags)
-        instance.recipe_ingredients.all().delete()
-        self.create_recipe_ingredients(instance, ingredients)
+        instance.tags.set(validated_data.pop('tags'))
+        self.update_recipe_ingredients(
+            instance, validated_data.pop('ingredients')
+        )
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
@@ -250,15 +462,25 @@ class CreateRecipeSerializer(RecipeSerializer):
 
 class FavoriteRecipeSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_webp = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipie
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_webp', 'cooking_time',)
 
     def get_image(self, obj):
-        if obj.image:
-            return self.context['request'].build_absolute_uri(obj.image.url)
-        return None
+        return build_absolute_uri(
+            self.context.get('request'), get_image_url(
+                obj.image, obj.image_derivatives, 'thumb'
+            )
+        )
+
+    def get_image_webp(self, obj):
+        return build_absolute_uri(
+            self.context.get('request'), get_derivative_url(
+                obj.image, obj.image_derivatives, 'thumb', 'WEBP'
+            )
+        )
 
 
 class ShortLinkSerializer(serializers.ModelSerializer):
@@ -277,6 +499,7 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Subscription
         fields = ('author',)
+        read_only_fields = fields
 
     def to_representation(self, instance):
         return UserProfileListRecipesSerilizer(
@@ -284,34 +507,40 @@ class SubscriptionCreateSerializer(serializers.ModelSerializer):
             context=self.context
         ).data
 
-    def validate(self, data):
-        author = data['author']
-        user = self.context['request'].user
-        if Subscription.objects.filter(
-            user=user,
-            author=author
-        ).exists():
-            raise serializers.ValidationError(ERROR_ALREADY_SUBSCRIBED)
+    def create(self, validated_data):
+        user, author = validated_data['user'], validated_data['author']
         if user == author:
-            raise serializers.ValidationError(ERROR_SELF_SUBSCRIPTION)
-        return data
+            raise_non_field_error(ERROR_SELF_SUBSCRIPTION)
+        if not insert_or_ignore(
+            Subscription, user_id=user.id, author_id=author.id
+        ):
+            raise_non_field_error(ERROR_ALREADY_SUBSCRIBED)
+        return Subscription(user=user, author=author)
 
 
 class BaseCreateRelationSerializer(serializers.ModelSerializer):
+    """Связь пользователя с рецептом, добавляемая одним запросом."""
 
     class Meta:
         fields = ('user', 'recipe')
+        read_only_fields = fields
 
-    def validate(self, data):
+    def insert(self, user_id, recipe_id):
+        return insert_or_ignore(
+            self.Meta.model, user_id=user_id, recipe_id=recipe_id
+        )
+
+    def create(self, validated_data):
         model = self.Meta.model
-        if model.objects.filter(
-            user=data.get('user'),
-            recipe=data.get('recipe')
-        ).exists():
-            raise serializers.ValidationError(
-                f'Запись уже существует в {model._meta.verbose_name}'
+        if not self.insert(
+            validated_data['user'].id, validated_data['recipe'].id
+        ):
+            raise_non_field_error(
+                ERROR_RELATION_EXISTS.format(model._meta.verbose_name)
             )
-        return data
+        return model(
+            user=validated_data['user'], recipe=validated_data['recipe']
+        )
 
     def to_representation(self, instance):
         return FavoriteRecipeSerializer(
@@ -319,6 +548,14 @@ class BaseCreateRelationSerializer(serializers.ModelSerializer):
         ).data
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_IDS
+    )
+
+
 class FavoriteCreateSerializer(BaseCreateRelationSerializer):
 
     class Meta(BaseCreateRelationSerializer.Meta):
@@ -329,3 +566,6 @@ class ShoppingCartCreateSerializer(BaseCreateRelationSerializer):
 
     class Meta(BaseCreateRelationSerializer.Meta):
         model = ShoppingCart
+
+    def insert(self, user_id, recipe_id):
+        return ShoppingCart.objects.insert_or_ignore(user_id, recipe_id)
@@ -0,0 +1,58 @@
+"""Обновление updated_at при изменениях, которых нет в полях модели.
+
+От updated_at зависят ключи кеша фрагментов (api.cache), ETag и
+Last-Modified.
+"""
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.ingredient_loader import ingredients_updated
+from recipes.models import Ingredient, RecipeIngredient, Recipie, Tag
+
+
+def touch_recipes(pks):
+    """Обновить updated_at рецептов, изменённых через связанные модели."""
+    Recipie.objects.filter(pk__in=list(pks)).update(
+        updated_at=timezone.now()
+    )
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    touch_recipes((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipie.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_recipes((instance.pk,))
+    elif action in ('post_add', 'post_remove'):
+        touch_recipes(pk_set)
+    elif action == 'pre_clear':
+        touch_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag(sender, instance, **kwargs):
+    touch_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient(sender, instance, **kwargs):
+    touch_recipes(
+        instance.recipe_ingredients.values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(ingredients_updated, sender=Ingredient)
+def invalidate_loaded_ingredients(sender, pks, **kwargs):
+    touch_recipes(
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=pks
+        ).values_list('recipe_id', flat=True).distinct()
+    )
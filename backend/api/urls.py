@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
+from api import async_views
 from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
 
 router = routers.DefaultRouter()
@@ -11,5 +13,21 @@ router.register('users', UserViewSet, basename='users')
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns += [
+        path('recipes/', async_views.recipe_list, name='recipes-list'),
+        path('recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipes-detail'),
+        path('tags/', async_views.tag_list, name='tags-list'),
+        path('tags/<int:pk>/', async_views.tag_detail, name='tags-detail'),
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredients-list'),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail,
+             name='ingredients-detail'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
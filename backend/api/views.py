@@ -1,47 +1,68 @@
-from io import BytesIO
+from functools import partial
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Sum
-from django.http import FileResponse
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Value,
+                              Window)
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django_filters import rest_framework
 from djoser.views import UserViewSet as BaseUserViewSet
 from rest_framework import permissions, status, viewsets
+from rest_framework.authentication import (SessionAuthentication,
+                                           TokenAuthentication)
 from rest_framework.decorators import action
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from api.filters import IngredientSearchFilter, RecipeFilter
-from api.pagination import PageNumberPagination
-from api.permissions import OwnerOrReadOnly
+from api.metrics import render_metrics
+from api.mixins import BulkRelationMixin, ConditionalRetrieveMixin
+from api.pagination import PageNumberOrKeysetPagination, UserPagination
+from api.permissions import OwnerOrReadOnly, StaffOrInternalNetwork
+from api.renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                           ShoppingListPDFRenderer, ShoppingListTextRenderer,
+                           astream)
 from api.serializers import (AvatarUpdateSerializer, CreateRecipeSerializer,
                              FavoriteCreateSerializer, IngredientSerializer,
                              RecipeSerializer, ShoppingCartCreateSerializer,
                              SubscriptionCreateSerializer, TagSerializer,
                              UserProfileListRecipesSerilizer,
                              UserProfileSerializer)
-from recipes.models import (Favorite, Ingredient, RecipeIngredient, Recipie,
-                            ShoppingCart, Tag)
+from foodgram.constants import (ERROR_RECIPE_NOT_FOUND,
+                                ERROR_SELF_SUBSCRIPTION, ERROR_USER_NOT_FOUND,
+                                SHOPPING_LIST_CHUNK_SIZE)
+from recipes.models import (Favorite, Ingredient, Recipie, ShoppingCart,
+                            ShoppingCartTotal, Tag)
+from recipes.tags import tag_registry
 from users.models import Subscription
 
 User = get_user_model()
 
 
-class UserViewSet(BaseUserViewSet):
+class UserViewSet(BulkRelationMixin, ConditionalRetrieveMixin,
+                  BaseUserViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    pagination_class = PageNumberPagination
+    pagination_class = UserPagination
+
+    def get_etag_parts(self, instance):
+        return super().get_etag_parts(instance) + (
+            UserProfileSerializer.is_subscribed_to(self.request, instance.pk),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_retrieve(request, self.get_object())
 
     @action(detail=False,
             url_path='me',
             permission_classes=(IsAuthenticated,))
     def me(self, request):
-        serializer = UserProfileSerializer(
-            request.user,
-            context={'request': request}
-        )
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.conditional_retrieve(request, request.user)
 
     @action(detail=False,
             methods=('put',),
@@ -62,17 +83,39 @@ class UserViewSet(BaseUserViewSet):
         request.user.avatar.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def get_subscription_recipes(request):
+        recipes = Recipie.objects.all()
+        recipes_limit = UserProfileListRecipesSerilizer.get_recipes_limit(
+            request
+        )
+        if recipes_limit:
+            # Top-N recipes of every author on the page in a single query.
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('pub_date').desc(), F('id').desc())
+                )
+            ).filter(row_number__lte=recipes_limit)
+        return recipes
+
+    @classmethod
+    def get_subscriptions(cls, request):
+        return User.objects.filter(
+            subscriptions_to_author__user=request.user
+        ).annotate(
+            recipes_count=Count('recipes')
+        ).prefetch_related(
+            Prefetch('recipes', queryset=cls.get_subscription_recipes(request))
+        ).order_by('last_name')
+
     @action(detail=False,
             methods=('get',),
             permission_classes=(IsAuthenticated,),
             url_path='subscriptions')
     def subscriptions(self, request):
-        subscriptions = User.objects.filter(
-            subscriptions_to_author__user=request.user
-        ).annotate(
-            recipes_count=Count('recipes')
-        ).order_by('last_name')
-        page = self.paginate_queryset(subscriptions)
+        page = self.paginate_queryset(self.get_subscriptions(request))
         serializer = UserProfileListRecipesSerilizer(
             page,
             many=True,
@@ -86,11 +129,11 @@ class UserViewSet(BaseUserViewSet):
     def subscribe(self, request, id=None):
         user_to_subscribe = get_object_or_404(User, pk=id)
         serializer = SubscriptionCreateSerializer(
-            data={'author': user_to_subscribe.id},
+            data={},
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user)
+        serializer.save(user=request.user, author=user_to_subscribe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
@@ -108,12 +151,31 @@ class UserViewSet(BaseUserViewSet):
             )
         )
 
+    @action(detail=False,
+            methods=('post',),
+            permission_classes=(IsAuthenticated,),
+            url_path='subscribe/bulk')
+    def bulk_subscribe(self, request):
+        return self.bulk_create_relations(
+            Subscription, 'author', User, ERROR_USER_NOT_FOUND,
+            errors={request.user.pk: ERROR_SELF_SUBSCRIPTION}
+        )
+
+    @bulk_subscribe.mapping.delete
+    def bulk_unsubscribe(self, request):
+        return self.bulk_delete_relations(Subscription, 'author')
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return Response(
+            self.get_serializer(tag_registry.all(), many=True).data
+        )
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
@@ -123,45 +185,71 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ('name',)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipie.objects.select_related('author').prefetch_related(
-        'tags',
-        'recipe_ingredients__ingredient'
-    ).all()
+class RecipeViewSet(BulkRelationMixin, ConditionalRetrieveMixin,
+                    viewsets.ModelViewSet):
+    # Теги и ингредиенты подгружаются только для рецептов,
+    # которых нет в кеше фрагментов (см. RecipeSerializer.represent).
+    queryset = Recipie.objects.select_related('author').all()
     serializer_class = RecipeSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           OwnerOrReadOnly)
     filter_backends = (rest_framework.DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = PageNumberOrKeysetPagination
 
-    @staticmethod
-    def generate_shopping_list_content(items):
-        content = ''
-        for item in items:
-            content += (
-                f'{item["ingredient__name"]} '
-                f'({item["ingredient__measurement_unit"]}) - '
-                f'{item["total_amount"]}\n'
+    def get_queryset(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return super().get_queryset().annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False)
             )
-        return content
+        return super().get_queryset().annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        )
+
+    def get_etag_parts(self, instance):
+        return super().get_etag_parts(instance) + (
+            instance.author.updated_at.isoformat(),
+            instance.is_favorited,
+            instance.is_in_shopping_cart,
+            UserProfileSerializer.is_subscribed_to(
+                self.request, instance.author_id
+            ),
+        )
+
+    def get_last_modified(self, instance):
+        return max(instance.updated_at, instance.author.updated_at)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_retrieve(request, self.get_object())
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return CreateRecipeSerializer
         return super().get_serializer_class()
 
+    def handle_exception(self, exc):
+        response = super().handle_exception(exc)
+        if self.action == 'download_shopping_cart':
+            # Ошибка — это JSON, а не файл списка в запрошенном формате.
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return response
+
     def _create_object(self, serializer_class, pk):
         recipe = get_object_or_404(Recipie, pk=pk)
-        data = {
-            'user': self.request.user.id,
-            'recipe': recipe.id
-        }
         serializer = serializer_class(
-            data=data,
+            data={},
             context={'request': self.request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer.save(user=self.request.user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def _delete_object(self, model, pk):
@@ -204,30 +292,67 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def delete_shopping_cart(self, request, pk=None):
         return self._delete_object(ShoppingCart, pk)
 
+    @action(
+        detail=False,
+        methods=('post',),
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='favorite/bulk'
+    )
+    def bulk_favorite(self, request):
+        return self.bulk_create_relations(
+            Favorite, 'recipe', Recipie, ERROR_RECIPE_NOT_FOUND
+        )
+
+    @bulk_favorite.mapping.delete
+    def bulk_delete_favorite(self, request):
+        return self.bulk_delete_relations(Favorite, 'recipe')
+
+    @action(
+        detail=False,
+        methods=('post',),
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path='shopping_cart/bulk'
+    )
+    def bulk_shopping_cart(self, request):
+        return self.bulk_create_relations(
+            ShoppingCart, 'recipe', Recipie, ERROR_RECIPE_NOT_FOUND,
+            insert=partial(
+                ShoppingCart.objects.insert_or_ignore_many, request.user.pk
+            )
+        )
+
+    @bulk_shopping_cart.mapping.delete
+    def bulk_delete_shopping_cart(self, request):
+        return self.bulk_delete_relations(ShoppingCart, 'recipe')
+
     @action(
         methods=('get',),
         detail=False,
         url_path='download_shopping_cart',
         permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(ShoppingListTextRenderer, ShoppingListCSVRenderer,
+                          ShoppingListJSONRenderer, ShoppingListPDFRenderer),
     )
     def download_shopping_cart(self, request):
-        items = RecipeIngredient.objects.filter(
-            recipe__shoppingcart__user=request.user
-        ).select_related('ingredient').values(
+        items = ShoppingCartTotal.objects.filter(
+            user=request.user
+        ).values_list(
             'ingredient__name',
             'ingredient__measurement_unit',
-        ).annotate(total_amount=Sum('amount'))
-        file_buffer = BytesIO(
-            self.generate_shopping_list_content(items).encode('utf-8')
-        )
-        response = FileResponse(
-            file_buffer,
-            content_type='text/plain',
-            as_attachment=True,
-            filename='ingredients_totals.txt'
+            'amount',
+        ).order_by('ingredient__name').iterator(
+            chunk_size=SHOPPING_LIST_CHUNK_SIZE
         )
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        content = renderer.stream(items)
+        if settings.ASYNC_READ_VIEWS:
+            content = astream(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
         response['Content-Disposition'] = (
-            'attachment; filename="ingredients_totals.txt"'
+            f'attachment; filename="ingredients_totals.{renderer.format}"'
         )
         return response
 
@@ -238,7 +363,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_recipe_short_link(self, request, pk):
         recipe = get_object_or_404(Recipie, id=pk)
-        short_link_path = reverse('short_link_redirect',
-                                  kwargs={'short_link': recipe.short_link})
+        short_link_path = reverse(
+            'short_link_redirect',
+            kwargs={'short_link': recipe.get_short_link()}
+        )
         short_link_url = request.build_absolute_uri(short_link_path)
         return Response({'short-link': short_link_url})
+
+
+class MetricsView(APIView):
+    """Метрики Prometheus всех воркеров."""
+
+    authentication_classes = (SessionAuthentication, TokenAuthentication)
+    permission_classes = (StaffOrInternalNetwork,)
+
+    def get(self, request):
+        content, content_type = render_metrics()
+        return HttpResponse(content, content_type=content_type)
@@ -6,7 +6,12 @@ MAX_UNIT_NAME_LENGTH = 64
 MAX_RECIPE_NAME_LENGTH = 256
 MIN_RECIPE_LENGTH_NAME = 1
 MAX_LINK_LENGTH = 64
-MAX_HASH_LENGTH = 10
+SHORT_LINK_LENGTH = 7
+SHORT_LINK_HALF_BITS = 20
+SHORT_LINK_ROUNDS = 4
+SHORT_LINK_ALPHABET = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
 MAX_STR_FIELD = 20
 MAX_INGREDIENT_AMOUNT = 32767
 MIN_INGREDIENT_AMOUNT = 1
@@ -24,3 +29,57 @@ ERROR_EMPTY_TAG = 'Ошибка создания рецепта: список т
 ERROR_NO_INGREDIENT = 'Ошибка обновления рецепта: ингредиент пустой'
 ERROR_NO_TAG = 'Ошибка обновления рецепта: теги пустые'
 ERROR_NO_IMAGE = 'Поле image не может быть пустым'
+ERROR_INVALID_CURSOR = 'Некорректный курсор пагинации'
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_TYPO_MIN_LENGTH = 4
+# Как часто (в секундах) процесс сверяет версию справочников в памяти.
+INDEX_VERSION_CHECK_INTERVAL = 2
+MAX_INDEX_NAME_LENGTH = 64
+SHOPPING_LIST_CHUNK_SIZE = 2000
+MAX_TAG_BITS = 63
+ERROR_TOO_MANY_TAGS = 'Ошибка создания тега: достигнуто предельное число тегов'
+MAX_BULK_IDS = 100
+ERROR_RECIPE_NOT_FOUND = 'Рецепт не найден'
+ERROR_USER_NOT_FOUND = 'Пользователь не найден'
+ERROR_RELATION_NOT_FOUND = 'Записи нет в {}'
+ERROR_RELATION_EXISTS = 'Запись уже существует в {}'
+RECIPE_FRONTEND_URL = '/recipes/{}'
+SHORT_LINK_MAP_CHUNK_SIZE = 2000
+IMAGE_DERIVATIVES_DIR = 'derivatives'
+IMAGE_DERIVATIVE_SIZES = {'thumb': 240, 'card': 720}
+IMAGE_DERIVATIVE_FORMATS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_DERIVATIVE_ATTEMPTS = 3
+IMAGE_DERIVATIVE_RETRY_DELAY = 1
+# Как max_length у ImageField по умолчанию.
+MAX_IMAGE_NAME_LENGTH = 100
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40 * 1000 * 1000
+BASE64_CHUNK_SIZE = 64 * 1024
+DATA_URL_HEADER_LIMIT = 256
+ERROR_INVALID_IMAGE = 'Загрузите корректное изображение в base64'
+ERROR_IMAGE_TYPE = 'Поддерживаются изображения JPEG, PNG, GIF и WebP'
+ERROR_IMAGE_TOO_LARGE = (
+    f'Размер изображения больше {MAX_IMAGE_SIZE // 1024 // 1024} МБ'
+)
+ERROR_IMAGE_TOO_MANY_PIXELS = (
+    f'Изображение больше {MAX_IMAGE_PIXELS // 1000 // 1000} мегапикселей'
+)
+INGREDIENT_LOAD_BATCH_SIZE = 5000
+INGREDIENT_JSON_READ_SIZE = 64 * 1024
+DATASET_BATCH_SIZE = 5000
+DATASET_PASSWORD = 'dataset-password'
+DATASET_IMAGE_NAME = 'recipes/dataset.jpg'
+DATASET_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'),
+    ('Выпечка', 'baking'),
+    ('Суп', 'soup'),
+    ('Салат', 'salad'),
+    ('Вегетарианское', 'vegetarian'),
+)
+SLOW_REQUEST_TOP_QUERIES = 5
+SLOW_REQUEST_SQL_LENGTH = 1000
+METRICS_DB_QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
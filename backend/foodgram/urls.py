@@ -3,13 +3,17 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from recipes.views import short_link_redirect
+from api.views import MetricsView
+from recipes.views import ashort_link_redirect, short_link_redirect
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:short_link>', short_link_redirect,
+    path('s/<str:short_link>',
+         ashort_link_redirect if settings.ASYNC_READ_VIEWS
+         else short_link_redirect,
          name='short_link_redirect'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
 if settings.DEBUG:
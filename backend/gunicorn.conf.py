@@ -0,0 +1,46 @@
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+# Каждый поток воркера держит не больше одного постоянного соединения с
+# базой, поэтому соединений от бэкенда не больше чем
+# workers * (threads + IMAGE_DERIVATIVE_WORKERS + 1), где 1 — поток
+# обновления справочников: держите это число ниже max_connections
+# PostgreSQL.
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# GUNICORN_ASGI=True: воркеры uvicorn и foodgram.asgi, где эндпоинты
+# чтения асинхронные и один воркер держит много медленных клиентов.
+if os.getenv('GUNICORN_ASGI', 'False') == 'True':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    wsgi_app = 'foodgram.asgi:application'
+    # Под ASGI синхронный код каждого запроса выполняется в потоке из
+    # пула, и постоянные соединения копились бы по одному на поток.
+    os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+# Каталог задаётся до запуска воркеров: prometheus_client читает его при
+# импорте и пишет значения каждого воркера в свои файлы.
+multiproc_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus'
+)
+
+
+def on_starting(server):
+    # Файлы прошлого запуска исказили бы счётчики.
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # Справочники в памяти воркера (recipes.search) сверяют версию в
+    # фоновом потоке, а не в запросах.
+    from recipes.search import start_refresher
+    start_refresher()
@@ -3,7 +3,8 @@ from django.db.models import Count
 from django.utils.safestring import mark_safe
 
 from recipes.models import (Favorite, Ingredient, RecipeIngredient, Recipie,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartTotal, Tag)
+from recipes.services import rebuild_cart_totals
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -20,7 +21,7 @@ class RecipieAdmin(admin.ModelAdmin):
     list_filter = ('tags',)
     inlines = (RecipeIngredientInline,)
     ordering = ('-pub_date',)
-    readonly_fields = ('get_favorites_count', 'short_link',
+    readonly_fields = ('get_favorites_count', 'get_short_link',
                        'pub_date', 'get_image')
 
     def get_queryset(self, request):
@@ -28,10 +29,23 @@ class RecipieAdmin(admin.ModelAdmin):
             favorites_count=Count('favorite')
         )
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            rebuild_cart_totals(
+                form.instance.shoppingcart_set.values_list(
+                    'user_id', flat=True
+                )
+            )
+
     @admin.display(description='Кол-во в избранном')
     def get_favorites_count(self, obj):
         return obj.favorites_count
 
+    @admin.display(description='Ссылка на рецепт')
+    def get_short_link(self, obj):
+        return obj.get_short_link() if obj.pk else '-'
+
     @admin.display(description='Изображение рецепта')
     def get_image(self, obj):
         return mark_safe(f'<img src={obj.image.url} width="80" height="60">')
@@ -83,3 +97,10 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit', )
     list_filter = ('name', 'measurement_unit')
     search_fields = ('name',)
+
+
+@admin.register(ShoppingCartTotal)
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+    list_filter = ('user',)
@@ -0,0 +1,175 @@
+"""Уменьшенные WebP- и JPEG-копии картинок рецептов и аватаров.
+
+Копии строятся после коммита в пуле потоков, лежат в хранилище под
+предсказуемыми именами и не пересоздаются, если уже есть, так что
+повторные попытки и команда build_image_derivatives безопасны. Когда копии
+готовы, имя картинки записывается в поле <поле>_derivatives модели; пока
+оно не совпадает с текущей картинкой, get_image_url отдаёт оригинал, а
+get_derivative_url — None. JPEG показывают все клиенты, WebP легче: API
+отдаёт оба URL, как источники элемента <picture>.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from foodgram.constants import (IMAGE_DERIVATIVE_ATTEMPTS,
+                                IMAGE_DERIVATIVE_FORMATS,
+                                IMAGE_DERIVATIVE_QUALITY,
+                                IMAGE_DERIVATIVE_RETRY_DELAY,
+                                IMAGE_DERIVATIVE_SIZES, IMAGE_DERIVATIVES_DIR)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+
+def get_formats():
+    return tuple(
+        image_format for image_format in IMAGE_DERIVATIVE_FORMATS
+        if image_format != 'WEBP' or features.check('webp')
+    )
+
+
+def get_derivative_name(name, size, image_format):
+    root, _ = os.path.splitext(name)
+    extension = IMAGE_DERIVATIVE_FORMATS[image_format]
+    return f'{IMAGE_DERIVATIVES_DIR}/{root}.{size}.{extension}'
+
+
+def get_derivative_url(image, derivatives, size, image_format):
+    """URL копии размера size в формате image_format или None.
+
+    derivatives — значение поля <поле>_derivatives: имя картинки, для
+    которой копии уже созданы. Хранилище при этом не опрашивается.
+    """
+    if (
+        not image
+        or derivatives != image.name
+        or image_format not in get_formats()
+    ):
+        return None
+    return image.storage.url(
+        get_derivative_name(image.name, size, image_format)
+    )
+
+
+def get_image_url(image, derivatives, size):
+    """URL JPEG-копии размера size или, пока её нет, оригинала."""
+    if not image:
+        return None
+    return get_derivative_url(image, derivatives, size, 'JPEG') or image.url
+
+
+def create_derivatives(storage, name):
+    """Создать недостающие копии картинки; возвращает их число."""
+    missing = [
+        (size, side, image_format,
+         get_derivative_name(name, size, image_format))
+        for size, side in IMAGE_DERIVATIVE_SIZES.items()
+        for image_format in get_formats()
+        if not storage.exists(get_derivative_name(name, size, image_format))
+    ]
+    if not missing:
+        return 0
+    with storage.open(name) as file, Image.open(file) as original:
+        original = ImageOps.exif_transpose(original)
+        resized = {}
+        for size, side, image_format, derivative_name in missing:
+            if size not in resized:
+                resized[size] = original.copy()
+                resized[size].thumbnail((side, side))
+            image = resized[size]
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            buffer = BytesIO()
+            image.save(
+                buffer, image_format, quality=IMAGE_DERIVATIVE_QUALITY
+            )
+            storage.save(derivative_name, ContentFile(buffer.getvalue()))
+    return len(missing)
+
+
+def mark_derivatives(model, pk, field, name):
+    """Записать, что копии картинки name готовы, и обновить updated_at.
+
+    Если картинку успели заменить, запись не меняется.
+    """
+    model.objects.filter(pk=pk, **{field: name}).exclude(
+        **{f'{field}_derivatives': name}
+    ).update(
+        **{f'{field}_derivatives': name}, updated_at=timezone.now()
+    )
+
+
+def build_derivatives(model, pk, field, storage, name):
+    """Создать копии с повторными попытками и отметить их в модели."""
+    try:
+        for attempt in range(1, IMAGE_DERIVATIVE_ATTEMPTS + 1):
+            try:
+                created = create_derivatives(storage, name)
+                break
+            except (FileNotFoundError, UnidentifiedImageError):
+                logger.warning('Не удалось открыть картинку %s', name)
+                return 0
+            except OSError:
+                if attempt == IMAGE_DERIVATIVE_ATTEMPTS:
+                    logger.exception('Не удалось создать копии %s', name)
+                    return 0
+                time.sleep(IMAGE_DERIVATIVE_RETRY_DELAY * attempt)
+        mark_derivatives(model, pk, field, name)
+        return created
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def build_in_pool(*args):
+    try:
+        return build_derivatives(*args)
+    finally:
+        # Поток пула живёт долго, а соединения по CONN_MAX_AGE Django
+        # закрывает только на границах HTTP-запросов.
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                thread_name_prefix='image-derivatives'
+            )
+        return _executor
+
+
+def schedule_derivatives(model, pk, image):
+    """Поставить картинку в очередь; при 0 воркеров — сразу."""
+    field = image.field.name
+    if (
+        not image
+        or getattr(image.instance, f'{field}_derivatives') == image.name
+    ):
+        return
+    with _lock:
+        if image.name in _pending:
+            return
+        _pending.add(image.name)
+    args = (model, pk, field, image.storage, image.name)
+    if not settings.IMAGE_DERIVATIVE_WORKERS:
+        build_derivatives(*args)
+        return
+    get_executor().submit(build_in_pool, *args)
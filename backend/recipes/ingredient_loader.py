@@ -0,0 +1,191 @@
+"""Потоковая загрузка справочника ингредиентов из CSV и JSON.
+
+Строки читаются и записываются пачками, ингредиенты сопоставляются по
+названию: новые добавляются, у существующих обновляется единица
+измерения. Если одно название встречается несколько раз, побеждает
+последняя строка.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from itertools import islice
+
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+from foodgram.constants import (INGREDIENT_JSON_READ_SIZE,
+                                MAX_INGRIDIENT_NAME_LENGTH,
+                                MAX_UNIT_NAME_LENGTH)
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+# Отправляется с sender=Ingredient и pks ингредиентов, у которых
+# изменилась единица измерения.
+ingredients_updated = Signal()
+
+JSON_SEPARATORS = ' \t\r\n,'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        yield row if len(row) == 2 else None
+
+
+def read_json(file, chunk_size=INGREDIENT_JSON_READ_SIZE):
+    """Элементы JSON-массива по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer += chunk
+        position = 0
+        while True:
+            while (
+                position < len(buffer)
+                and buffer[position] in JSON_SEPARATORS
+            ):
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('ожидается JSON-массив')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            if not isinstance(item, dict):
+                yield None
+                continue
+            yield item.get('name'), item.get('measurement_unit')
+        buffer = buffer[position:]
+        if not chunk:
+            raise ValueError('JSON-массив не закрыт')
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+def clean_rows(rows, stats):
+    for row in rows:
+        stats['read'] += 1
+        if row is None:
+            continue
+        name, measurement_unit = (
+            value.strip() if isinstance(value, str) else ''
+            for value in row
+        )
+        if (
+            name and measurement_unit
+            and len(name) <= MAX_INGRIDIENT_NAME_LENGTH
+            and len(measurement_unit) <= MAX_UNIT_NAME_LENGTH
+        ):
+            yield name, measurement_unit
+
+
+def get_batches(rows, batch_size):
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def upsert_batch(batch):
+    """Записать пачку через ORM; возвращает (добавлено, pks обновлённых)."""
+    units = dict(batch)
+    existing = {
+        name: (pk, measurement_unit)
+        for pk, name, measurement_unit in Ingredient.objects.filter(
+            name__in=units
+        ).values_list('pk', 'name', 'measurement_unit')
+    }
+    created = []
+    updated = []
+    for name, measurement_unit in units.items():
+        if name not in existing:
+            created.append(
+                Ingredient(name=name, measurement_unit=measurement_unit)
+            )
+        elif existing[name][1] != measurement_unit:
+            updated.append(Ingredient(
+                pk=existing[name][0],
+                name=name,
+                measurement_unit=measurement_unit
+            ))
+    Ingredient.objects.bulk_create(created)
+    Ingredient.objects.bulk_update(updated, ('measurement_unit',))
+    return len(created), [ingredient.pk for ingredient in updated]
+
+
+def copy_and_upsert(batches):
+    """PostgreSQL: COPY во временную таблицу и два запроса на всё."""
+    table = connection.ops.quote_name(Ingredient._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_staging ('
+            'position bigserial, name text, measurement_unit text'
+            ') ON COMMIT DROP'
+        )
+        for batch in batches:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_source ON COMMIT DROP AS '
+            'SELECT DISTINCT ON (name) name, measurement_unit '
+            'FROM ingredient_staging ORDER BY name, position DESC'
+        )
+        cursor.execute(
+            f'UPDATE {table} AS ingredient '
+            'SET measurement_unit = source.measurement_unit '
+            'FROM ingredient_source AS source '
+            'WHERE ingredient.name = source.name '
+            'AND ingredient.measurement_unit <> source.measurement_unit '
+            'RETURNING ingredient.id'
+        )
+        updated = [pk for pk, in cursor.fetchall()]
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredient_source '
+            'ON CONFLICT (name) DO NOTHING'
+        )
+        return cursor.rowcount, updated
+
+
+def load_ingredients(rows, batch_size, use_copy=None):
+    """Загрузить строки (name, measurement_unit).
+
+    Возвращает Counter с ключами read, inserted, updated и skipped.
+    """
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    stats = Counter(read=0, inserted=0, updated=0)
+    batches = get_batches(clean_rows(rows, stats), batch_size)
+    updated = []
+    with transaction.atomic():
+        if use_copy:
+            stats['inserted'], updated = copy_and_upsert(batches)
+        else:
+            for batch in batches:
+                inserted, batch_updated = upsert_batch(batch)
+                stats['inserted'] += inserted
+                updated.extend(batch_updated)
+        stats['updated'] = len(updated)
+        if updated:
+            ingredients_updated.send(sender=Ingredient, pks=updated)
+    stats['skipped'] = stats['read'] - stats['inserted'] - stats['updated']
+    ingredient_index.invalidate()
+    return stats
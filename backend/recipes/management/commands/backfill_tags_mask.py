@@ -0,0 +1,34 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipie
+from recipes.services import get_tags_mask
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает маски тегов рецептов по связям recipe-tag.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        bits = defaultdict(list)
+        for recipe_id, bit in Recipie.tags.through.objects.values_list(
+            'recipie_id', 'tag__bit'
+        ).iterator():
+            bits[recipe_id].append(bit)
+        recipes = []
+        updated = 0
+        for recipe in Recipie.objects.only('id', 'tags_mask').iterator():
+            mask = get_tags_mask(bits.get(recipe.pk, ()))
+            if recipe.tags_mask != mask:
+                recipe.tags_mask = mask
+                recipes.append(recipe)
+            if len(recipes) >= options['batch_size']:
+                updated += Recipie.objects.bulk_update(recipes, ('tags_mask',))
+                recipes = []
+        updated += Recipie.objects.bulk_update(recipes, ('tags_mask',))
+        self.stdout.write(self.style.SUCCESS(
+            f'Маски тегов обновлены у {updated} рецептов.'
+        ))
@@ -0,0 +1,109 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+from recipes.models import Recipie
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку запросов к базе с новым соединением на '
+            'каждый запрос и с постоянными соединениями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Запросов на каждый поток.')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Потоков, как потоков воркеров gunicorn.')
+        parser.add_argument('--max-age', type=int,
+                            help='CONN_MAX_AGE постоянного режима; '
+                                 'по умолчанию из настроек (не меньше 60).')
+
+    def handle(self, *args, **options):
+        settings_dict = connections.settings['default']
+        original = (
+            settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS']
+        )
+        max_age = options['max_age'] or max(original[0] or 0, 60)
+        modes = (
+            ('на каждый запрос', 0, False),
+            (f'постоянные ({max_age} с, с проверкой)', max_age, True),
+        )
+        try:
+            for title, conn_max_age, health_checks in modes:
+                settings_dict['CONN_MAX_AGE'] = conn_max_age
+                settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+                self.report(title, *self.run(
+                    options['requests'], options['concurrency']
+                ))
+        finally:
+            (settings_dict['CONN_MAX_AGE'],
+             settings_dict['CONN_HEALTH_CHECKS']) = original
+
+    def run(self, requests, concurrency):
+        connection.close()
+        latencies = []
+        backends = set()
+        opened = []
+        lock = threading.Lock()
+
+        def count_connection(sender, **kwargs):
+            with lock:
+                opened.append(sender)
+
+        def worker():
+            local_latencies = []
+            local_backends = set()
+            try:
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    request_started.send(sender=self.__class__)
+                    local_backends.add(self.simulate_request())
+                    request_finished.send(sender=self.__class__)
+                    local_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                backends.update(local_backends)
+
+        connection_created.connect(count_connection)
+        try:
+            threads = [
+                threading.Thread(target=worker) for _ in range(concurrency)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            connection_created.disconnect(count_connection)
+        backends.discard(None)
+        return latencies, len(opened), len(backends)
+
+    def simulate_request(self):
+        """Запросы, как у страницы списка рецептов; возвращает pid
+        процесса PostgreSQL, обслужившего соединение."""
+        list(Recipie.objects.order_by('-pk').values_list('pk', 'name')[:6])
+        Recipie.objects.count()
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def report(self, title, latencies, opened, backends):
+        latencies = sorted(latency * 1000 for latency in latencies)
+        quantiles = statistics.quantiles(latencies, n=100)
+        line = (
+            f'{title}: запросов {len(latencies)}, '
+            f'p50 {quantiles[49]:.2f} мс, p95 {quantiles[94]:.2f} мс, '
+            f'p99 {quantiles[98]:.2f} мс; открыто соединений {opened}'
+        )
+        if backends:
+            line += f', процессов PostgreSQL {backends}'
+        self.stdout.write(line)
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_derivatives
+from recipes.models import Recipie
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Создаёт недостающие уменьшенные копии картинок рецептов '
+            'и аватаров.')
+
+    def handle(self, *args, **options):
+        created = 0
+        for model, field in ((Recipie, 'image'), (User, 'avatar')):
+            for obj in model.objects.exclude(**{field: ''}).exclude(
+                **{f'{field}__isnull': True}
+            ).only('pk', field).iterator():
+                image = getattr(obj, field)
+                created += build_derivatives(
+                    model, obj.pk, field, image.storage, image.name
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано копий картинок: {created}.'
+        ))
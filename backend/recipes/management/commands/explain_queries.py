@@ -0,0 +1,226 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.pagination import KeysetPagination
+from api.views import RecipeViewSet, UserViewSet
+from recipes.models import (RecipeIngredient, Recipie, ShoppingCart,
+                            ShoppingCartTotal, Tag)
+from recipes.services import get_cart_totals_queryset
+
+User = get_user_model()
+
+# Строка плана с последовательным чтением таблицы; группа 1 — таблица.
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\S+)'),
+    'sqlite': re.compile(
+        r'\bSCAN (?!CONSTANT ROW)(\S+)(?!.* USING (?:COVERING )?INDEX)'
+    ),
+}
+# Полное чтение индекса: таблица читается целиком, только в порядке
+# индекса. Шаблоны применяются к узлам плана; группа 1 — таблица.
+INDEX_SCAN_PATTERNS = {
+    'postgresql': re.compile(
+        r'^\s*Index (?:Only )?Scan (?:Backward )?using \S+ on (\S+)'
+        r'(?![\s\S]*Index Cond:)'
+    ),
+    'sqlite': re.compile(r'\bSCAN (\S+) USING (?:COVERING )?INDEX'),
+}
+PLAN_NODE_SEPARATORS = {
+    'postgresql': re.compile(r'->'),
+    'sqlite': re.compile(r'\n'),
+}
+# Подзапросы, которые SQLite строит сам: их чтение целиком — не ошибка.
+SUBQUERY_PATTERN = re.compile(r'(?:CO-ROUTINE|MATERIALIZE) (\S+)')
+PAGE_SIZE = KeysetPagination.page_size
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN (на PostgreSQL — EXPLAIN ANALYZE) для '
+            'основных запросов API и отмечает последовательное чтение '
+            'таблиц и полное чтение индексов. Запускать на данных '
+            'рабочего объёма: на маленьких таблицах планировщик и без '
+            'того читает их целиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user',
+                            help='username, от имени которого строятся '
+                                 'запросы; по умолчанию — владелец самой '
+                                 'большой корзины.')
+        parser.add_argument('--no-analyze', action='store_true',
+                            help='Только план, без выполнения запросов.')
+        parser.add_argument('--fail-on-seq-scan', action='store_true',
+                            help='Завершиться с ошибкой, если есть '
+                                 'последовательное чтение или полное '
+                                 'чтение индекса.')
+
+    def handle(self, *args, **options):
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'База {connection.vendor} не поддерживается: '
+                'нужен PostgreSQL или SQLite.'
+            )
+        explain_options = {}
+        if connection.vendor == 'postgresql' and not options['no_analyze']:
+            explain_options = {'analyze': True, 'buffers': True}
+        flagged = []
+        for name, queryset in self.get_queries(self.get_user(options)):
+            plan = self.explain(queryset, explain_options)
+            subqueries = set(SUBQUERY_PATTERN.findall(plan))
+            scans = {
+                'Последовательное чтение': self.find_tables(
+                    pattern, plan.splitlines(), subqueries
+                ),
+            }
+            # Страница без фильтров: чтение индекса по порядку
+            # останавливает LIMIT, целиком индекс не читается.
+            if not self.is_first_page(queryset):
+                scans['Полное чтение индекса'] = self.find_tables(
+                    INDEX_SCAN_PATTERNS[connection.vendor],
+                    PLAN_NODE_SEPARATORS[connection.vendor].split(plan),
+                    subqueries
+                )
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            for scan, tables in scans.items():
+                if tables:
+                    self.stdout.write(self.style.WARNING(
+                        f'{scan}: {", ".join(tables)}'
+                    ))
+            if any(scans.values()):
+                flagged.append(name)
+            self.stdout.write('')
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS(
+                'Последовательного чтения и полного чтения индексов нет.'
+            ))
+        elif options['fail_on_seq_scan']:
+            raise CommandError(
+                'Последовательное чтение или полное чтение индекса '
+                f'в запросах: {", ".join(flagged)}'
+            )
+
+    @staticmethod
+    def find_tables(pattern, nodes, subqueries):
+        return sorted({
+            match.group(1) for node in nodes if (match := pattern.search(node))
+        } - subqueries)
+
+    @staticmethod
+    def is_first_page(queryset):
+        return queryset.query.is_sliced and not queryset.query.where
+
+    @staticmethod
+    def explain(queryset, options):
+        # Не queryset.explain(): при фильтре по оконной функции Django
+        # переносит префикс EXPLAIN во внутренний подзапрос.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix(**options)} {sql}',
+                params
+            )
+            return '\n'.join(
+                ' '.join(str(value) for value in row)
+                for row in cursor.fetchall()
+            )
+
+    def get_user(self, options):
+        if options['user']:
+            try:
+                return User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(
+                    f'Пользователь {options["user"]} не найден.'
+                )
+        user_id = ShoppingCart.objects.values('user_id').annotate(
+            recipes=Count('id')
+        ).order_by('-recipes').values_list('user_id', flat=True).first()
+        user = (
+            User.objects.filter(pk=user_id).first()
+            or User.objects.order_by('pk').first()
+        )
+        if user is None:
+            raise CommandError(
+                'Пользователей нет: сначала выполните generate_dataset.'
+            )
+        return user
+
+    @staticmethod
+    def get_request(user, **params):
+        request = Request(RequestFactory().get('/', params))
+        request.user = user
+        return request
+
+    def get_recipes(self, user, **params):
+        """Запрос списка рецептов, как у RecipeViewSet с параметрами."""
+        request = self.get_request(user, **params)
+        view = RecipeViewSet(
+            request=request, args=(), kwargs={}, format_kwarg=None,
+            action='list'
+        )
+        return request, view.filter_queryset(view.get_queryset())
+
+    def get_queries(self, user):
+        """Пары (название, запрос) в том виде, в каком их строит API."""
+        _, recipes = self.get_recipes(user)
+        yield 'Лента рецептов', recipes[:PAGE_SIZE]
+        middle = recipes[recipes.count() // 2:].first()
+        if middle is not None:
+            paginator = KeysetPagination()
+            request, recipes = self.get_recipes(user, cursor=(
+                paginator.encode_cursor(paginator.get_position(middle), False)
+            ))
+            yield 'Лента рецептов, keyset', paginator.get_page_queryset(
+                recipes, request
+            )
+            yield 'Рецепты автора', self.get_recipes(
+                user, author=middle.author_id
+            )[1][:PAGE_SIZE]
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        if tag is not None:
+            yield 'Рецепты с тегом', self.get_recipes(
+                user, tags=tag
+            )[1][:PAGE_SIZE]
+        yield 'Избранное', self.get_recipes(
+            user, is_favorited=1
+        )[1][:PAGE_SIZE]
+        yield 'Рецепты в корзине', self.get_recipes(
+            user, is_in_shopping_cart=1
+        )[1][:PAGE_SIZE]
+
+        request = self.get_request(user, recipes_limit=3)
+        subscriptions = UserViewSet.get_subscriptions(request)
+        yield 'Подписки', subscriptions[:PAGE_SIZE]
+        yield 'Рецепты авторов в подписках', (
+            UserViewSet.get_subscription_recipes(request).filter(
+                author__in=list(
+                    subscriptions.values_list('pk', flat=True)[:PAGE_SIZE]
+                )
+            )
+        )
+
+        cart = ShoppingCart.objects.filter(user=user)
+        yield 'Пересчёт итогов корзины', get_cart_totals_queryset((user.pk,))
+        # Как в update_cart_totals и update_recipe_cart_totals.
+        yield 'Ингредиенты рецептов корзины', RecipeIngredient.objects.filter(
+            recipe_id__in=list(cart.values_list('recipe_id', flat=True))
+        ).values_list('recipe_id', 'ingredient_id', 'amount')
+        recipe_id = cart.values_list('recipe_id', flat=True).first()
+        if recipe_id is None:
+            recipe_id = Recipie.objects.values_list('pk', flat=True).first()
+        yield 'Корзины с рецептом', ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+        # Как в RecipeViewSet.download_shopping_cart.
+        yield 'Список покупок', ShoppingCartTotal.objects.filter(
+            user=user
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).order_by('ingredient__name')
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.short_link_map import export_short_link_map, reload_nginx
+
+
+class Command(BaseCommand):
+    help = ('Выгружает короткие ссылки рецептов в map-файл nginx '
+            'и перезагружает nginx.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir',
+            default=settings.SHORT_LINK_MAP_DIR,
+            help='Каталог map-файлов (по умолчанию SHORT_LINK_MAP_DIR).'
+        )
+        parser.add_argument(
+            '--no-reload',
+            action='store_true',
+            help='Не выполнять SHORT_LINK_MAP_RELOAD_COMMAND.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['dir']:
+            raise CommandError(
+                'Не задан каталог карты: SHORT_LINK_MAP_DIR или --dir.'
+            )
+        count = export_short_link_map(options['dir'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено коротких ссылок: {count}.'
+        ))
+        if not options['no_reload'] and reload_nginx():
+            self.stdout.write(self.style.SUCCESS('nginx перезагружен.'))
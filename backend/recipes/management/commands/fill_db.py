@@ -1,13 +1,17 @@
-import csv
 import os
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from recipes.models import Ingredient
+from foodgram.constants import INGREDIENT_LOAD_BATCH_SIZE
+from recipes.ingredient_loader import READERS, load_ingredients
 
 
 class Command(BaseCommand):
+    help = ('Загружает или обновляет ингредиенты из CSV (name,unit) '
+            'или JSON-массива объектов {name, measurement_unit}.')
+
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path',
@@ -15,6 +19,21 @@ class Command(BaseCommand):
             nargs='?',
             default='./data/ingredients.csv'
         )
+        parser.add_argument(
+            '--format',
+            choices=tuple(READERS),
+            help='Формат файла (по умолчанию — по расширению).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=INGREDIENT_LOAD_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.'
+        )
 
     def handle(self, *args, **options):
         file_path = options['file_path']
@@ -27,26 +46,33 @@ class Command(BaseCommand):
                 file_path = os.path.join(settings.BASE_DIR, file_path)
         if not os.path.exists(file_path):
             raise FileNotFoundError('файл не найден')
+        file_format = (
+            options['format']
+            or os.path.splitext(file_path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
         self.stdout.write(self.style.NOTICE('Загрузка ингредиентов начата.'))
+        started = time.monotonic()
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                ingredients_to_create = []
-                for name, measurement_unit in reader:
-                    ingredients_to_create.append(
-                        Ingredient(
-                            name=name.strip(),
-                            measurement_unit=measurement_unit.strip())
-                    )
-                Ingredient.objects.bulk_create(
-                    ingredients_to_create,
-                    ignore_conflicts=True
+            with open(file_path, 'r', encoding='utf-8', newline='') as f:
+                stats = load_ingredients(
+                    READERS[file_format](f),
+                    options['batch_size'],
+                    use_copy=False if options['no_copy'] else None
                 )
         except Exception as e:
             self.stderr.write(
                 self.style.ERROR(f'Ошибка при чтении/записи: {e}')
             )
             raise
-        self.stdout.write(
-            self.style.SUCCESS('Загрузка ингредиентов завершена.')
-        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка ингредиентов завершена за {elapsed:.2f} с '
+            f'({stats["read"] / max(elapsed, 1e-6):.0f} строк/с): '
+            f'добавлено {stats["inserted"]}, '
+            f'обновлено {stats["updated"]}, '
+            f'пропущено {stats["skipped"]}.'
+        ))
@@ -0,0 +1,241 @@
+import random
+import time
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from foodgram.constants import (DATASET_BATCH_SIZE, DATASET_IMAGE_NAME,
+                                DATASET_PASSWORD, DATASET_TAGS,
+                                MAX_COOKING_TIME, MAX_INGREDIENT_AMOUNT,
+                                MIN_COOKING_TIME)
+from recipes.images import create_derivatives
+from recipes.models import (Favorite, Ingredient, RecipeIngredient, Recipie,
+                            ShoppingCart, Tag)
+from recipes.services import get_tags_mask, rebuild_cart_totals
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class ZipfSampler:
+    """Выбор с вероятностью ~ 1 / rank ** exponent: немногие элементы
+    популярны, у остальных длинный хвост."""
+
+    def __init__(self, population, exponent, rng):
+        self.population = list(population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ))
+        self.rng = rng
+
+    def choice(self):
+        return self.sample(1)[0]
+
+    def sample(self, k):
+        """k различных элементов (не больше половины совокупности)."""
+        k = min(k, len(self.population) // 2 or len(self.population))
+        picked = {}
+        while len(picked) < k:
+            picked.update(dict.fromkeys(self.rng.choices(
+                self.population,
+                cum_weights=self.cum_weights,
+                k=k - len(picked)
+            )))
+        return list(picked)
+
+
+class Command(BaseCommand):
+    help = ('Генерирует воспроизводимый набор данных для нагрузочных '
+            'тестов: пользователей, рецепты, избранное, корзины и '
+            'подписки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=20,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Среднее число рецептов в избранном.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='load',
+                            help='Префикс username и email пользователей.')
+        parser.add_argument('--batch-size', type=int,
+                            default=DATASET_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if not ingredients:
+            raise CommandError(
+                'Справочник ингредиентов пуст: сначала выполните fill_db.'
+            )
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть: '
+                'задайте другой --prefix.'
+            )
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно не меньше 2 пользователей и 1 рецепта.')
+        started = time.monotonic()
+        with transaction.atomic():
+            users = self.create_users(prefix, options['users'])
+            tags = self.get_tags()
+            recipes = self.create_recipes(
+                users, tags, ingredients, options['recipes']
+            )
+            self.report('Подписки', self.bulk_create(
+                Subscription.objects,
+                self.generate_relations(
+                    users, users, options['subscriptions'],
+                    lambda user, author: Subscription(
+                        user_id=user, author_id=author
+                    ),
+                    self_allowed=False
+                )
+            ))
+            self.report('Избранное', self.bulk_create(
+                Favorite.objects,
+                self.generate_relations(
+                    users, recipes, options['favorites'],
+                    lambda user, recipe: Favorite(
+                        user_id=user, recipe_id=recipe
+                    )
+                )
+            ))
+            # Итоги корзин пересчитываются один раз в конце, а не на
+            # каждую пачку в ShoppingCartQuerySet.bulk_create.
+            self.report('Корзины', self.bulk_create(
+                ShoppingCart._base_manager,
+                self.generate_relations(
+                    users, recipes, options['cart'],
+                    lambda user, recipe: ShoppingCart(
+                        user_id=user, recipe_id=recipe
+                    )
+                )
+            ))
+            # Пачками: список из всех id упирается в лимит параметров SQL.
+            self.report('Итоги корзин', sum(
+                len(rebuild_cart_totals(users[start:start + self.batch_size]))
+                for start in range(0, len(users), self.batch_size)
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Набор данных создан за {time.monotonic() - started:.1f} с.'
+        ))
+
+    def report(self, title, count):
+        self.stdout.write(f'{title}: {count}')
+
+    def bulk_create(self, manager, objs):
+        count = 0
+        objs = iter(objs)
+        while batch := list(islice(objs, self.batch_size)):
+            manager.bulk_create(batch, batch_size=self.batch_size)
+            count += len(batch)
+        return count
+
+    def create_users(self, prefix, count):
+        password = make_password(DATASET_PASSWORD)
+        users = []
+        for start in range(0, count, self.batch_size):
+            users.extend(User.objects.bulk_create(
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name=f'Имя{number}',
+                    last_name=f'Фамилия{number}',
+                    password=password
+                )
+                for number in range(
+                    start, min(start + self.batch_size, count)
+                )
+            ))
+        self.report('Пользователи', len(users))
+        return [user.pk for user in users]
+
+    def get_tags(self):
+        for name, slug in DATASET_TAGS:
+            Tag.objects.get_or_create(slug=slug, defaults={'name': name})
+        return list(Tag.objects.order_by('pk').values_list('pk', 'bit'))
+
+    def get_image_name(self):
+        # Одна картинка на все рецепты; копии для неё строятся один раз.
+        storage = Recipie._meta.get_field('image').storage
+        if not storage.exists(DATASET_IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new('RGB', (800, 600), (214, 160, 96)).save(buffer, 'JPEG')
+            storage.save(DATASET_IMAGE_NAME, ContentFile(buffer.getvalue()))
+        create_derivatives(storage, DATASET_IMAGE_NAME)
+        return DATASET_IMAGE_NAME
+
+    def create_recipes(self, users, tags, ingredients, count):
+        image = self.get_image_name()
+        authors = ZipfSampler(users, 1.1, self.rng)
+        tag_sampler = ZipfSampler(tags, 0.8, self.rng)
+        ingredient_sampler = ZipfSampler(ingredients, 1.0, self.rng)
+        recipes = []
+        links = 0
+        for start in range(0, count, self.batch_size):
+            batch = []
+            batch_tags = []
+            for number in range(start, min(start + self.batch_size, count)):
+                recipe_tags = tag_sampler.sample(self.rng.randint(1, 3))
+                batch_tags.append(recipe_tags)
+                batch.append(Recipie(
+                    author_id=authors.choice(),
+                    name=f'Рецепт {number}',
+                    text=f'Описание рецепта {number}.',
+                    image=image,
+                    image_derivatives=image,
+                    cooking_time=self.rng.randint(
+                        MIN_COOKING_TIME, min(MAX_COOKING_TIME, 180)
+                    ),
+                    tags_mask=get_tags_mask(bit for _, bit in recipe_tags)
+                ))
+            Recipie.objects.bulk_create(batch)
+            Recipie.tags.through.objects.bulk_create(
+                Recipie.tags.through(recipie_id=recipe.pk, tag_id=tag)
+                for recipe, recipe_tags in zip(batch, batch_tags)
+                for tag, _ in recipe_tags
+            )
+            links += self.bulk_create(RecipeIngredient.objects, (
+                RecipeIngredient(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient,
+                    amount=self.rng.randint(1, min(MAX_INGREDIENT_AMOUNT, 500))
+                )
+                for recipe in batch
+                for ingredient in ingredient_sampler.sample(
+                    self.rng.randint(3, 12)
+                )
+            ))
+            recipes.extend(recipe.pk for recipe in batch)
+        self.report('Рецепты', len(recipes))
+        self.report('Ингредиенты рецептов', links)
+        return recipes
+
+    def generate_relations(self, users, targets, mean, build,
+                           self_allowed=True):
+        """Связи пользователей с целями: число связей пользователя
+        распределено экспоненциально, цели выбираются по Ципфу, так что
+        у популярных целей степенной хвост входящих связей."""
+        if mean <= 0:
+            return
+        sampler = ZipfSampler(targets, 1.0, self.rng)
+        for user in users:
+            count = int(self.rng.expovariate(1 / mean))
+            for target in sampler.sample(count):
+                if self_allowed or target != user:
+                    yield build(user, target)
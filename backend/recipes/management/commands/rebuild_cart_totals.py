@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartTotal
+from recipes.services import calculate_cart_totals, rebuild_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает итоги корзин покупок или сверяет их (--check).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить итоги, не изменяя их.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            totals = rebuild_cart_totals()
+            self.stdout.write(self.style.SUCCESS(
+                f'Итоги корзин пересчитаны: {len(totals)} строк.'
+            ))
+            return
+        expected = calculate_cart_totals()
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in (
+                ShoppingCartTotal.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                )
+            )
+        }
+        mismatches = sorted(
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        )
+        for user_id, ingredient_id in mismatches:
+            self.stderr.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'ожидается {expected.get((user_id, ingredient_id))}, '
+                f'в таблице {actual.get((user_id, ingredient_id))}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в итогах корзин: {len(mismatches)}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги корзин совпадают: {len(expected)} строк.'
+        ))
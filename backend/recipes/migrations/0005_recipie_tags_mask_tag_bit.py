@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-18 20:07
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_tag_bits(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipie = apps.get_model('recipes', 'Recipie')
+    tags = list(Tag.objects.order_by('id'))
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ('bit',))
+    masks = defaultdict(int)
+    for recipe_id, bit in Recipie.tags.through.objects.values_list(
+        'recipie_id', 'tag__bit'
+    ):
+        masks[recipe_id] |= 1 << bit
+    Recipie.objects.bulk_update(
+        (
+            Recipie(pk=recipe_id, tags_mask=mask)
+            for recipe_id, mask in masks.items()
+        ),
+        ('tags_mask',),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipie',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.RunPython(fill_tag_bits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_alter_tag_bit'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipie',
+            name='short_link',
+            field=models.CharField(blank=True, editable=False, help_text='Сохраняется только у рецептов со старыми ссылками', max_length=64, null=True, unique=True, verbose_name='Ссылка на рецепт'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_indexversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipie',
+            name='image_derivatives',
+            field=models.CharField(blank=True, editable=False, help_text='Имя картинки, для которой созданы уменьшенные копии', max_length=100, verbose_name='Картинка с готовыми копиями'),
+        ),
+    ]
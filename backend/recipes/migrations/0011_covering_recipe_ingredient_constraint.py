@@ -0,0 +1,26 @@
+# Generated by Django 5.0 on 2026-10-18 21:13
+
+import recipes.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipie_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='recipeingredient',
+            name='unique_ingredient_in_recipe',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipeingredient',
+            name='recipe_ingredient_amount_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=recipes.models.CoveringUniqueConstraint(fields=('recipe', 'ingredient'), include=('amount',), name='unique_ingredient_in_recipe'),
+        ),
+    ]
@@ -1,17 +1,50 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
 
-from foodgram.constants import (MAX_COOKING_TIME, MAX_INGREDIENT_AMOUNT,
+from foodgram.constants import (MAX_COOKING_TIME, MAX_IMAGE_NAME_LENGTH,
+                                MAX_INDEX_NAME_LENGTH, MAX_INGREDIENT_AMOUNT,
                                 MAX_INGRIDIENT_NAME_LENGTH, MAX_LINK_LENGTH,
                                 MAX_RECIPE_NAME_LENGTH, MAX_STR_FIELD,
                                 MAX_TAG_LENGTH, MAX_UNIT_NAME_LENGTH,
                                 MIN_COOKING_TIME, MIN_INGREDIENT_AMOUNT)
-from recipes.services import generate_short_link
+from recipes.services import (encode_short_link, get_free_tag_bit,
+                              insert_or_ignore, insert_or_ignore_many,
+                              update_cart_totals)
 
 User = get_user_model()
 
 
+class CoveringUniqueConstraint(models.UniqueConstraint):
+    """UniqueConstraint с include, который не пропадает на SQLite.
+
+    Django не создаёт ограничение с include там, где нет покрывающих
+    индексов; здесь вместо него создаётся обычное, без include.
+    """
+
+    def for_connection(self, connection):
+        if connection.features.supports_covering_indexes:
+            return self
+        path, args, kwargs = self.deconstruct()
+        kwargs.pop('include')
+        return models.UniqueConstraint(*args, **kwargs)
+
+    def constraint_sql(self, model, schema_editor):
+        return models.UniqueConstraint.constraint_sql(
+            self.for_connection(schema_editor.connection), model, schema_editor
+        )
+
+    def create_sql(self, model, schema_editor):
+        return models.UniqueConstraint.create_sql(
+            self.for_connection(schema_editor.connection), model, schema_editor
+        )
+
+    def remove_sql(self, model, schema_editor):
+        return models.UniqueConstraint.remove_sql(
+            self.for_connection(schema_editor.connection), model, schema_editor
+        )
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         'Название ингредиента',
@@ -47,12 +80,22 @@ class Tag(models.Model):
         max_length=MAX_TAG_LENGTH,
         unique=True
     )
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске тегов',
+        unique=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = get_free_tag_bit()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name[:MAX_STR_FIELD]
 
@@ -61,13 +104,21 @@ class Recipie(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        verbose_name='Автор рецепта'
+        verbose_name='Автор рецепта',
+        db_index=False
     )
     image = models.ImageField(
         'Картинка',
         upload_to='recipes/',
         help_text='Изображение блюда'
     )
+    image_derivatives = models.CharField(
+        'Картинка с готовыми копиями',
+        max_length=MAX_IMAGE_NAME_LENGTH,
+        blank=True,
+        editable=False,
+        help_text='Имя картинки, для которой созданы уменьшенные копии'
+    )
     name = models.CharField(
         'Название',
         max_length=MAX_RECIPE_NAME_LENGTH,
@@ -94,6 +145,10 @@ class Recipie(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -103,10 +158,18 @@ class Recipie(models.Model):
         Tag,
         verbose_name='Теги'
     )
+    tags_mask = models.BigIntegerField(
+        'Маска тегов',
+        default=0,
+        editable=False
+    )
     short_link = models.CharField(
         'Ссылка на рецепт',
         max_length=MAX_LINK_LENGTH,
-        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Сохраняется только у рецептов со старыми ссылками'
     )
 
     class Meta:
@@ -114,21 +177,42 @@ class Recipie(models.Model):
         default_related_name = 'recipes'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-
-    def save(self, *args, **kwargs):
-        self.short_link = generate_short_link(self.short_link, self.id)
-        super().save(*args, **kwargs)
+        indexes = (
+            # Лента и keyset-пагинация: ORDER BY pub_date DESC, id DESC.
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_idx'
+            ),
+            # Фильтр по автору с той же сортировкой, рецепты и их число
+            # в подписках; заменяет индекс внешнего ключа author.
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
+        constraints = (
+            # Старые ссылки есть у немногих рецептов: в индексе только они.
+            models.UniqueConstraint(
+                fields=('short_link',),
+                condition=models.Q(short_link__isnull=False),
+                name='unique_legacy_short_link'
+            ),
+        )
 
     def __str__(self):
         return self.name[:MAX_STR_FIELD]
 
+    def get_short_link(self):
+        return self.short_link or encode_short_link(self.pk)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipie,
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
-        related_name='recipe_ingredients'
+        related_name='recipe_ingredients',
+        db_index=False
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -153,8 +237,11 @@ class RecipeIngredient(models.Model):
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
         constraints = (
-            models.UniqueConstraint(
+            # Индекс уникальности заодно покрывает итоги корзин:
+            # количества рецептов читаются без обращения к таблице.
+            CoveringUniqueConstraint(
                 fields=('recipe', 'ingredient'),
+                include=('amount',),
                 name='unique_ingredient_in_recipe'
             ),
         )
@@ -167,15 +254,21 @@ class RecipeIngredient(models.Model):
 
 
 class BaseUserRecipeRelation(models.Model):
+    """Индексы внешних ключей не создаются: по user ищут через
+    уникальное ограничение (user, recipe), по recipe — через индекс
+    (recipe, user) наследника."""
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipie,
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
+        db_index=False
     )
 
     class Meta:
@@ -193,6 +286,12 @@ class Favorite(BaseUserRecipeRelation):
     class Meta:
         verbose_name = 'Рецепт в избранном'
         verbose_name_plural = 'Рецепты в избранных'
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'),
+                name='favorite_recipe_user_idx'
+            ),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
@@ -201,13 +300,134 @@ class Favorite(BaseUserRecipeRelation):
         )
 
 
+class ShoppingCartQuerySet(models.QuerySet):
+    """Массовые изменения корзин сразу пересчитывают их итоги."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # Пропущенные при конфликте строки попали бы в итоги повторно;
+        # для вставки без дублей есть insert_or_ignore_many.
+        if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+            raise ValueError(
+                'ShoppingCart.objects.bulk_create() не поддерживает '
+                'ignore_conflicts и update_conflicts: используйте '
+                'insert_or_ignore_many().'
+            )
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            update_cart_totals(
+                ((obj.user_id, obj.recipe_id) for obj in objs), 1
+            )
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            update_cart_totals(self.values_list('user_id', 'recipe_id'), -1)
+            return super().delete()
+
+    def insert_or_ignore(self, user_id, recipe_id):
+        with transaction.atomic(using=self.db):
+            inserted = insert_or_ignore(
+                self.model, user_id=user_id, recipe_id=recipe_id
+            )
+            if inserted:
+                update_cart_totals(((user_id, recipe_id),), 1)
+        return inserted
+
+    def insert_or_ignore_many(self, user_id, recipe_ids):
+        """Добавить рецепты в корзину; возвращает ids добавленных."""
+        with transaction.atomic(using=self.db):
+            inserted = insert_or_ignore_many(
+                self.model, ('user_id', 'recipe_id'),
+                ((user_id, recipe_id) for recipe_id in recipe_ids)
+            )
+            update_cart_totals(inserted, 1)
+        return [recipe_id for _, recipe_id in inserted]
+
+
 class ShoppingCart(BaseUserRecipeRelation):
+    objects = ShoppingCartQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепт в корзине'
         verbose_name_plural = 'Рецепты в корзинах'
+        indexes = (
+            # Корзины с изменённым рецептом (update_recipe_cart_totals).
+            models.Index(
+                fields=('recipe', 'user'),
+                name='cart_recipe_user_idx'
+            ),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'recipe'),
                 name='unique_user_recipe_in_cart'
             ),
         )
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                update_cart_totals(((self.user_id, self.recipe_id),), 1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            update_cart_totals(((self.user_id, self.recipe_id),), -1)
+            return super().delete(*args, **kwargs)
+
+
+class ShoppingCartTotal(models.Model):
+    # По user ищут через уникальное ограничение (user, ingredient).
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_totals',
+        db_index=False
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_cart_totals'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Итог корзины'
+        verbose_name_plural = 'Итоги корзин'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient_total'
+            ),
+        )
+
+    def __str__(self):
+        return (
+            f'{self.user.username} — '
+            f'{self.ingredient.name[:MAX_STR_FIELD]}: {self.amount}'
+        )
+
+
+class IndexVersion(models.Model):
+    """Версия справочника, который процессы держат в памяти.
+
+    Общая для всех воркеров: см. recipes.search.ProcessLocalIndex.
+    """
+
+    name = models.CharField(
+        'Справочник',
+        max_length=MAX_INDEX_NAME_LENGTH,
+        primary_key=True
+    )
+    version = models.PositiveBigIntegerField('Версия', default=0)
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from itertools import islice
+
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+
+from foodgram.constants import (INDEX_VERSION_CHECK_INTERVAL,
+                                INGREDIENT_SEARCH_LIMIT,
+                                INGREDIENT_TYPO_MIN_LENGTH)
+from recipes.models import IndexVersion, Ingredient
+from recipes.services import insert_or_ignore
+
+logger = logging.getLogger(__name__)
+
+# Все справочники процесса; их обновляет поток start_refresher.
+indexes = []
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def within_one_edit(first, second):
+    if abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    for index, (left, right) in enumerate(zip(first, second)):
+        if left != right:
+            if len(first) == len(second):
+                return first[index + 1:] == second[index + 1:]
+            return first[index:] == second[index + 1:]
+    return True
+
+
+def is_typo_match(term, key):
+    return any(
+        within_one_edit(term, key[:length])
+        for length in (len(term) - 1, len(term), len(term) + 1)
+    )
+
+
+class ProcessLocalIndex(ABC):
+    """Данные из БД, закешированные в памяти процесса.
+
+    Загружаются при первом обращении и перезагружаются, когда меняется
+    общая для всех процессов версия в IndexVersion (см. invalidate).
+    Версию сверяет не запрос, а фоновый поток воркера (start_refresher)
+    раз в INDEX_VERSION_CHECK_INTERVAL секунд: другие воркеры видят
+    изменения с такой задержкой, процесс, изменивший данные, — сразу после
+    коммита. В БД запрос идёт, только если данных в процессе ещё нет.
+    """
+
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (версия, данные) одним объектом: поток обновления подменяет его
+        # целиком, не блокируя читающих.
+        self._state = None
+        indexes.append(self)
+
+    @abstractmethod
+    def get_queryset(self):
+        """Объекты, из которых строится индекс."""
+
+    @abstractmethod
+    def build(self, objects):
+        """Данные индекса из списка объектов get_queryset."""
+
+    def invalidate(self):
+        """Сменить версию; вызывать в транзакции, изменившей данные."""
+        versions = IndexVersion.objects.filter(name=self.version_key)
+        if not versions.update(version=F('version') + 1):
+            if not insert_or_ignore(
+                IndexVersion, name=self.version_key, version=1
+            ):
+                versions.update(version=F('version') + 1)
+        transaction.on_commit(self.refresh)
+
+    def get_versions(self):
+        return IndexVersion.objects.filter(
+            name=self.version_key
+        ).values_list('version', flat=True)
+
+    def load(self):
+        # Версия читается до данных: если их изменят между запросами,
+        # следующая сверка перезагрузит индекс.
+        version = self.get_versions().first()
+        return version, self.build(list(self.get_queryset()))
+
+    async def aload(self):
+        version = await self.get_versions().afirst()
+        return version, self.build([obj async for obj in self.get_queryset()])
+
+    def refresh(self):
+        """Перезагрузить данные, если их версия сменилась."""
+        with self._lock:
+            if (
+                self._state is None
+                or self.get_versions().first() != self._state[0]
+            ):
+                self._state = self.load()
+
+    def get_entries(self):
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = self.load()
+                state = self._state
+        return state[1]
+
+    async def aget_entries(self):
+        state = self._state
+        if state is None:
+            state = self._state = await self.aload()
+        return state[1]
+
+
+def refresh_indexes(interval=INDEX_VERSION_CHECK_INTERVAL):
+    while True:
+        for index in indexes:
+            try:
+                index.refresh()
+            except DatabaseError:
+                logger.exception(
+                    'Не удалось обновить справочник %s', index.version_key
+                )
+        # Поток живёт долго, а соединения по CONN_MAX_AGE Django
+        # закрывает только на границах HTTP-запросов.
+        close_old_connections()
+        time.sleep(interval)
+
+
+def start_refresher():
+    """Загрузить справочники и сверять их версии в фоновом потоке.
+
+    Вызывается в каждом воркере (gunicorn.conf.post_worker_init).
+    """
+    threading.Thread(
+        target=refresh_indexes, name='index-refresher', daemon=True
+    ).start()
+
+
+class IngredientIndex(ProcessLocalIndex):
+    """Отсортированный индекс названий ингредиентов для автодополнения."""
+
+    version_key = 'ingredient-index'
+
+    def get_queryset(self):
+        return Ingredient.objects.all()
+
+    def build(self, ingredients):
+        ingredients = sorted(
+            ingredients,
+            key=lambda ingredient: normalize(ingredient.name)
+        )
+        keys = [normalize(ingredient.name) for ingredient in ingredients]
+        return keys, ingredients
+
+    def search(self, term, limit=INGREDIENT_SEARCH_LIMIT, typos=True):
+        return self.match(self.get_entries(), term, limit, typos)
+
+    async def asearch(self, term, limit=INGREDIENT_SEARCH_LIMIT, typos=True):
+        return self.match(await self.aget_entries(), term, limit, typos)
+
+    @staticmethod
+    def match(entries, term, limit, typos):
+        """Совпадения по началу названия, затем по подстроке,
+        затем с одной опечаткой."""
+        keys, ingredients = entries
+        term = normalize(term)
+        if not term:
+            return list(ingredients)
+        found = []
+        index = bisect_left(keys, term)
+        while (
+            index < len(keys)
+            and keys[index].startswith(term)
+            and len(found) < limit
+        ):
+            found.append(index)
+            index += 1
+        found.extend(islice(
+            (
+                index for index, key in enumerate(keys)
+                if term in key and not key.startswith(term)
+            ),
+            limit - len(found)
+        ))
+        if typos and len(term) >= INGREDIENT_TYPO_MIN_LENGTH:
+            matched = set(found)
+            found.extend(islice(
+                (
+                    index for index, key in enumerate(keys)
+                    if index not in matched and is_typo_match(term, key)
+                ),
+                limit - len(found)
+            ))
+        return [ingredients[index] for index in found]
+
+
+ingredient_index = IngredientIndex()
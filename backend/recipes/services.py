@@ -1,22 +1,285 @@
 import hashlib
+import hmac
+from collections import defaultdict
 
 from django.apps import apps
-from django.utils import timezone
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import F, Sum
 
-from foodgram.constants import MAX_HASH_LENGTH
+from foodgram.constants import (ERROR_TOO_MANY_TAGS, MAX_TAG_BITS,
+                                SHORT_LINK_ALPHABET, SHORT_LINK_HALF_BITS,
+                                SHORT_LINK_LENGTH, SHORT_LINK_ROUNDS)
 
 
-def generate_short_link(short_link, id):
-    if not short_link:
-        Recipie = apps.get_model('recipes', 'Recipie')
-        base_str = f'{timezone.now().timestamp()}{id if id else ""}'
-        short_link = (
-            hashlib
-            .md5(base_str.encode()).hexdigest()[:MAX_HASH_LENGTH]
+def permute_short_link_id(value, rounds):
+    """Сеть Фейстеля на 2 * SHORT_LINK_HALF_BITS битах с ключом
+    SHORT_LINK_KEY: взаимно однозначна, обратная — раунды в обратном
+    порядке."""
+    mask = (1 << SHORT_LINK_HALF_BITS) - 1
+    left, right = value >> SHORT_LINK_HALF_BITS, value & mask
+    for round_number in rounds:
+        digest = hmac.new(
+            settings.SHORT_LINK_KEY.encode(),
+            f'{round_number}:{right}'.encode(),
+            hashlib.sha256
+        ).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:4], 'big') & mask)
+    return (right << SHORT_LINK_HALF_BITS) | left
+
+
+def encode_short_link(pk):
+    """Короткая ссылка рецепта: base62 от переставленного pk.
+
+    Уникальна без обращения к базе, так как перестановка биективна.
+    """
+    if not 0 < pk < 1 << 2 * SHORT_LINK_HALF_BITS:
+        raise ValueError(f'pk {pk} вне диапазона коротких ссылок')
+    value = permute_short_link_id(pk, range(SHORT_LINK_ROUNDS))
+    base = len(SHORT_LINK_ALPHABET)
+    chars = []
+    for _ in range(SHORT_LINK_LENGTH):
+        value, index = divmod(value, base)
+        chars.append(SHORT_LINK_ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def decode_short_link(short_link):
+    """pk рецепта по короткой ссылке или None для чужих строк."""
+    if len(short_link) != SHORT_LINK_LENGTH:
+        return None
+    value = 0
+    for char in short_link:
+        index = SHORT_LINK_ALPHABET.find(char)
+        if index < 0:
+            return None
+        value = value * len(SHORT_LINK_ALPHABET) + index
+    if value >= 1 << 2 * SHORT_LINK_HALF_BITS:
+        return None
+    return permute_short_link_id(
+        value, reversed(range(SHORT_LINK_ROUNDS))
+    ) or None
+
+
+def insert_or_ignore(model, **values):
+    """Добавляет строку одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает False, если такая строка уже есть.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in values]
+    sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT DO NOTHING'.format(
+        quote_name(model._meta.db_table),
+        ', '.join(quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields))
+    )
+    params = [
+        field.get_db_prep_save(value, connection)
+        for field, value in zip(fields, values.values())
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount == 1
+
+
+def insert_or_ignore_many(model, fields, rows):
+    """Добавляет строки одним INSERT ... ON CONFLICT DO NOTHING.
+
+    rows — кортежи значений полей fields; возвращает добавленные из них,
+    уже существующие пропускаются.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    connection = connections[router.db_for_write(model)]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        return [
+            row for row in rows
+            if insert_or_ignore(model, **dict(zip(fields, row)))
+        ]
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in fields]
+    columns = ', '.join(quote_name(field.column) for field in fields)
+    placeholders = '({})'.format(', '.join(['%s'] * len(fields)))
+    sql = (
+        'INSERT INTO {} ({}) VALUES {} ON CONFLICT DO NOTHING '
+        'RETURNING {}'
+    ).format(
+        quote_name(model._meta.db_table),
+        columns,
+        ', '.join([placeholders] * len(rows)),
+        columns
+    )
+    params = [
+        field.get_db_prep_save(value, connection)
+        for row in rows
+        for field, value in zip(fields, row)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def get_free_tag_bit():
+    Tag = apps.get_model('recipes', 'Tag')
+    used = set(Tag.objects.values_list('bit', flat=True))
+    for bit in range(MAX_TAG_BITS):
+        if bit not in used:
+            return bit
+    raise ValidationError(ERROR_TOO_MANY_TAGS)
+
+
+def get_tags_mask(bits):
+    mask = 0
+    for bit in bits:
+        mask |= 1 << bit
+    return mask
+
+
+def set_tags_mask_bits(recipes, mask, value):
+    """Установить (value=True) или сбросить биты mask у рецептов."""
+    if not mask:
+        return
+    if value:
+        recipes.update(tags_mask=F('tags_mask').bitor(mask))
+        return
+    recipes.alias(
+        masked=F('tags_mask').bitand(mask)
+    ).exclude(masked=0).update(tags_mask=F('tags_mask').bitand(~mask))
+
+
+def apply_cart_total_deltas(deltas):
+    """Изменить итоги корзин на deltas = {(user_id, ingredient_id): delta}.
+
+    Строки пользователей блокируются, поэтому параллельные изменения
+    корзины одного пользователя выполняются по очереди.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    user_ids = {user_id for user_id, _ in deltas}
+    with transaction.atomic():
+        list(
+            User.objects.select_for_update()
+            .filter(pk__in=user_ids)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        totals = {
+            (total.user_id, total.ingredient_id): total
+            for total in ShoppingCartTotal.objects.filter(
+                user_id__in=user_ids,
+                ingredient_id__in={
+                    ingredient_id for _, ingredient_id in deltas
+                }
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for (user_id, ingredient_id), delta in deltas.items():
+            total = totals.get((user_id, ingredient_id))
+            if total is None:
+                if delta > 0:
+                    to_create.append(ShoppingCartTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=delta
+                    ))
+                continue
+            total.amount += delta
+            if total.amount > 0:
+                to_update.append(total)
+            else:
+                to_delete.append(total.pk)
+        ShoppingCartTotal.objects.bulk_create(to_create)
+        ShoppingCartTotal.objects.bulk_update(to_update, ('amount',))
+        ShoppingCartTotal.objects.filter(pk__in=to_delete).delete()
+
+
+def update_cart_totals(pairs, sign):
+    """Учесть добавление (sign=1) или удаление (sign=-1) рецептов
+    из корзин; pairs — пары (user_id, recipe_id)."""
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    pairs = list(pairs)
+    ingredients = defaultdict(list)
+    for recipe_id, ingredient_id, amount in (
+        RecipeIngredient.objects.filter(
+            recipe_id__in={recipe_id for _, recipe_id in pairs}
+        ).values_list('recipe_id', 'ingredient_id', 'amount')
+    ):
+        ingredients[recipe_id].append((ingredient_id, amount))
+    deltas = defaultdict(int)
+    for user_id, recipe_id in pairs:
+        for ingredient_id, amount in ingredients[recipe_id]:
+            deltas[user_id, ingredient_id] += sign * amount
+    apply_cart_total_deltas(deltas)
+
+
+def update_recipe_cart_totals(recipe_id, old_amounts, new_amounts):
+    """Перенести изменение ингредиентов рецепта в итоги всех корзин,
+    где он лежит; *_amounts — словари {ingredient_id: amount}."""
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    changes = {
+        ingredient_id: (
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        )
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    changes = {
+        ingredient_id: delta
+        for ingredient_id, delta in changes.items() if delta
+    }
+    if not changes:
+        return
+    apply_cart_total_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+        for ingredient_id, delta in changes.items()
+    })
+
+
+def get_cart_totals_queryset(user_ids=None):
+    """Строки (user_id, ingredient_id, amount) итогов корзин."""
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    carts = ShoppingCart.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    return carts.values_list(
+        'user_id', 'recipe__recipe_ingredients__ingredient_id'
+    ).annotate(
+        amount=Sum('recipe__recipe_ingredients__amount')
+    ).order_by()
+
+
+def calculate_cart_totals(user_ids=None):
+    """Посчитать итоги корзин заново по ShoppingCart и RecipeIngredient."""
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in get_cart_totals_queryset(
+            user_ids
+        )
+        if ingredient_id is not None
+    }
+
+
+def rebuild_cart_totals(user_ids=None):
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    totals = calculate_cart_totals(user_ids)
+    with transaction.atomic():
+        existing = ShoppingCartTotal.objects.all()
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+        existing.delete()
+        ShoppingCartTotal.objects.bulk_create(
+            ShoppingCartTotal(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for (user_id, ingredient_id), amount in totals.items()
         )
-        i = 1
-        original_url = short_link
-        while Recipie.objects.filter(short_link=short_link).exists():
-            short_link = f'{original_url[:(MAX_HASH_LENGTH - 1)]}{i}'
-            i += 1
-    return short_link
+    return totals
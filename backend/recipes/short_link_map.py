@@ -0,0 +1,152 @@
+"""Карта коротких ссылок для nginx: ``/s/<ссылка> /recipes/<pk>;``.
+
+Полная выгрузка пишется в short_links.map, первая строка которого хранит
+наибольший выгруженный pk. Новые рецепты дописываются в
+short_links.incremental.map, только если их pk больше этого значения,
+поэтому одна ссылка никогда не попадает в оба файла (nginx не загрузит
+map с повторяющимися ключами). Ссылки удалённых рецептов вычёркиваются
+из того файла, где они есть. Ссылки, которых ещё нет в карте,
+обрабатывает short_link_redirect.
+"""
+import fcntl
+import os
+import re
+import shlex
+import subprocess
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max
+from django.urls import reverse
+
+from foodgram.constants import RECIPE_FRONTEND_URL, SHORT_LINK_MAP_CHUNK_SIZE
+from recipes.models import Recipie
+
+FULL_MAP_NAME = 'short_links.map'
+INCREMENTAL_MAP_NAME = 'short_links.incremental.map'
+LOCK_NAME = '.short_links.lock'
+WATERMARK_PATTERN = re.compile(r'# max_pk (\d+)')
+ENTRY_PK_PATTERN = re.compile(r' /recipes/(\d+);$')
+
+
+def format_entry(recipe):
+    path = reverse(
+        'short_link_redirect',
+        kwargs={'short_link': recipe.get_short_link()}
+    )
+    return f'{path} {RECIPE_FRONTEND_URL.format(recipe.pk)};\n'
+
+
+@contextmanager
+def map_lock(directory):
+    with open(directory / LOCK_NAME, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_watermark(directory):
+    try:
+        with open(directory / FULL_MAP_NAME, encoding='utf-8') as file:
+            match = WATERMARK_PATTERN.fullmatch(file.readline().strip())
+    except FileNotFoundError:
+        return 0
+    return int(match[1]) if match else 0
+
+
+def get_temporary_path(path):
+    # Без суффикса .map, чтобы include *.map в nginx его не подхватил.
+    return path.with_name(f'.{path.name}.tmp')
+
+
+def export_short_link_map(directory):
+    """Выгрузить карту всех рецептов; возвращает число записей."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    max_pk = Recipie.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+    full_path = directory / FULL_MAP_NAME
+    temporary_path = get_temporary_path(full_path)
+    count = 0
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        file.write(f'# max_pk {max_pk}\n')
+        for recipe in Recipie.objects.filter(pk__lte=max_pk).only(
+            'pk', 'short_link'
+        ).order_by('pk').iterator(chunk_size=SHORT_LINK_MAP_CHUNK_SIZE):
+            file.write(format_entry(recipe))
+            count += 1
+    with map_lock(directory):
+        # Сначала убираем из инкрементального файла то, что войдёт в
+        # полный: в промежутке ссылки могут временно пропасть из карты,
+        # но не задвоиться.
+        incremental_path = directory / INCREMENTAL_MAP_NAME
+        try:
+            with open(incremental_path, encoding='utf-8') as file:
+                lines = [
+                    line for line in file
+                    if int(ENTRY_PK_PATTERN.search(line)[1]) > max_pk
+                ]
+        except FileNotFoundError:
+            lines = []
+        temporary_incremental_path = get_temporary_path(incremental_path)
+        with open(temporary_incremental_path, 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        os.replace(temporary_incremental_path, incremental_path)
+        os.replace(temporary_path, full_path)
+    return count
+
+
+def append_short_link(directory, recipe):
+    """Дописать ссылку нового рецепта, если её нет в полной выгрузке."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with map_lock(directory):
+        if recipe.pk <= read_watermark(directory):
+            return
+        with open(
+            directory / INCREMENTAL_MAP_NAME, 'a', encoding='utf-8'
+        ) as file:
+            file.write(format_entry(recipe))
+
+
+def remove_short_link(directory, pk):
+    """Вычеркнуть из карты ссылку удалённого рецепта."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return False
+    entry_end = f' {RECIPE_FRONTEND_URL.format(pk)};\n'
+    with map_lock(directory):
+        path = directory / (
+            FULL_MAP_NAME if pk <= read_watermark(directory)
+            else INCREMENTAL_MAP_NAME
+        )
+        temporary_path = get_temporary_path(path)
+        removed = False
+        try:
+            with (
+                open(path, encoding='utf-8') as source,
+                open(temporary_path, 'w', encoding='utf-8') as target
+            ):
+                for line in source:
+                    if line.endswith(entry_end):
+                        removed = True
+                    else:
+                        target.write(line)
+        except FileNotFoundError:
+            return False
+        if removed:
+            os.replace(temporary_path, path)
+        else:
+            os.remove(temporary_path)
+        return removed
+
+
+def reload_nginx():
+    """Выполнить SHORT_LINK_MAP_RELOAD_COMMAND, если она задана."""
+    command = settings.SHORT_LINK_MAP_RELOAD_COMMAND
+    if not command:
+        return False
+    subprocess.run(shlex.split(command), check=True)
+    return True
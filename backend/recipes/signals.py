@@ -0,0 +1,112 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.images import schedule_derivatives
+from recipes.models import Ingredient, Recipie, ShoppingCart, Tag
+from recipes.search import ingredient_index
+from recipes.services import (get_tags_mask, set_tags_mask_bits,
+                              update_cart_totals)
+from recipes.short_link_map import append_short_link, remove_short_link
+from recipes.tags import tag_registry
+
+User = get_user_model()
+
+
+@receiver(pre_delete, sender=Recipie)
+def remove_recipe_from_cart_totals(sender, instance, **kwargs):
+    # Корзины удаляются каскадом без ShoppingCart.delete(); в pre_delete
+    # ингредиенты рецепта ещё на месте.
+    update_cart_totals(
+        ShoppingCart.objects.filter(recipe=instance).values_list(
+            'user_id', 'recipe_id'
+        ),
+        -1
+    )
+
+
+@receiver(post_save, sender=Recipie)
+def add_short_link_to_map(sender, instance, created, **kwargs):
+    if created and settings.SHORT_LINK_MAP_DIR:
+        transaction.on_commit(
+            partial(append_short_link, settings.SHORT_LINK_MAP_DIR, instance),
+            robust=True
+        )
+
+
+@receiver(post_delete, sender=Recipie)
+def remove_short_link_from_map(sender, instance, **kwargs):
+    if settings.SHORT_LINK_MAP_DIR:
+        transaction.on_commit(
+            partial(
+                remove_short_link, settings.SHORT_LINK_MAP_DIR, instance.pk
+            ),
+            robust=True
+        )
+
+
+@receiver(post_save, sender=Recipie)
+def build_recipe_image_derivatives(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(schedule_derivatives, sender, instance.pk, instance.image),
+        robust=True
+    )
+
+
+@receiver(post_save, sender=User)
+def build_avatar_derivatives(sender, instance, **kwargs):
+    if instance.avatar:
+        transaction.on_commit(
+            partial(
+                schedule_derivatives, sender, instance.pk, instance.avatar
+            ),
+            robust=True
+        )
+
+
+@receiver(m2m_changed, sender=Recipie.tags.through)
+def sync_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    value = action == 'post_add'
+    if reverse:
+        recipes = Recipie.objects.all()
+        if action != 'post_clear':
+            recipes = recipes.filter(pk__in=pk_set)
+        set_tags_mask_bits(recipes, get_tags_mask((instance.bit,)), value)
+        return
+    recipes = Recipie.objects.filter(pk=instance.pk)
+    if action == 'post_clear':
+        recipes.update(tags_mask=0)
+        instance.tags_mask = 0
+        return
+    mask = get_tags_mask(
+        Tag.objects.filter(pk__in=pk_set).values_list('bit', flat=True)
+    )
+    set_tags_mask_bits(recipes, mask, value)
+    # Последующий instance.save() не должен затереть маску в БД.
+    instance.tags_mask = (
+        instance.tags_mask | mask if value else instance.tags_mask & ~mask
+    )
+
+
+@receiver(pre_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    set_tags_mask_bits(
+        Recipie.objects.all(), get_tags_mask((instance.bit,)), False
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_registry(sender, **kwargs):
+    tag_registry.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
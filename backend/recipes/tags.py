@@ -0,0 +1,37 @@
+from recipes.models import Tag
+from recipes.search import ProcessLocalIndex
+
+
+class TagRegistry(ProcessLocalIndex):
+    """Все теги в памяти процесса: их мало, и меняются они редко."""
+
+    version_key = 'tag-registry'
+
+    def get_queryset(self):
+        return Tag.objects.all()
+
+    def build(self, tags):
+        return tags, {tag.slug: tag for tag in tags}
+
+    def all(self):
+        return self.get_entries()[0]
+
+    async def aall(self):
+        return (await self.aget_entries())[0]
+
+    def choices(self):
+        return [(tag.slug, tag.name) for tag in self.all()]
+
+    def get_mask(self, slugs):
+        by_slug = self.get_entries()[1]
+        mask = 0
+        for slug in slugs:
+            if slug in by_slug:
+                mask |= 1 << by_slug[slug].bit
+        return mask
+
+    def from_mask(self, mask):
+        return [tag for tag in self.all() if mask >> tag.bit & 1]
+
+
+tag_registry = TagRegistry()
@@ -1,10 +1,31 @@
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect
 from rest_framework.decorators import api_view
 
+from foodgram.constants import RECIPE_FRONTEND_URL
 from recipes.models import Recipie
+from recipes.services import decode_short_link
+
+
+def get_lookup(short_link):
+    pk = decode_short_link(short_link)
+    return {'pk': pk} if pk else {'short_link': short_link}
+
+
+def redirect_to_recipe(request, recipe):
+    return redirect(
+        request.build_absolute_uri(RECIPE_FRONTEND_URL.format(recipe.pk))
+    )
 
 
 @api_view(('GET',))
 def short_link_redirect(request, short_link):
-    recipe = get_object_or_404(Recipie, short_link=short_link)
-    return redirect(request.build_absolute_uri(f'/recipes/{recipe.pk}'))
+    return redirect_to_recipe(request, get_object_or_404(
+        Recipie.objects.only('pk'), **get_lookup(short_link)
+    ))
+
+
+async def ashort_link_redirect(request, short_link):
+    """short_link_redirect на асинхронном ORM (ASYNC_READ_VIEWS)."""
+    return redirect_to_recipe(request, await aget_object_or_404(
+        Recipie.objects.only('pk'), **get_lookup(short_link)
+    ))
@@ -0,0 +1,107 @@
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+
+from recipes.models import Recipie, ShoppingCart
+from users.models import User
+
+DATA_DIR = Path(settings.BASE_DIR).parent / 'data'
+DATASET_OPTIONS = (
+    '--users', '300', '--recipes', '3000', '--subscriptions', '15',
+    '--favorites', '20', '--cart', '8', '--seed', '20', '--batch-size', '1000'
+)
+
+benchmark_results = []
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark')
+    group.addoption(
+        '--benchmark-rounds',
+        type=int,
+        default=int(os.getenv('BENCHMARK_ROUNDS', 20)),
+        help='Сколько раз запрашивать каждый эндпоинт.'
+    )
+    group.addoption(
+        '--benchmark-json',
+        default=os.getenv('BENCHMARK_JSON', '.benchmarks/latest.json'),
+        help='Куда записать результаты замеров.'
+    )
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not benchmark_results:
+        return
+    path = Path(session.config.getoption('--benchmark-json'))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'revision': get_git_revision(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'rounds': session.config.getoption('--benchmark-rounds'),
+        'dataset': DATASET_OPTIONS,
+        'results': sorted(benchmark_results, key=lambda item: item['name']),
+    }, ensure_ascii=False, indent=2))
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker, tmp_path_factory):
+    media = override_settings(MEDIA_ROOT=tmp_path_factory.mktemp('media'))
+    media.enable()
+    with django_db_blocker.unblock():
+        call_command('fill_db', str(DATA_DIR / 'ingredients.csv'))
+        call_command('generate_dataset', *DATASET_OPTIONS)
+    yield
+    media.disable()
+
+
+@pytest.fixture(scope='session')
+def dataset(django_db_setup, django_db_blocker):
+    """Идентификаторы характерных объектов сгенерированного набора."""
+    with django_db_blocker.unblock():
+        follower = User.objects.annotate(
+            count=Count('user_subscriptions')
+        ).order_by('-count', 'pk').first()
+        buyer = ShoppingCart.objects.values('user').annotate(
+            count=Count('pk')
+        ).order_by('-count', 'user').first()['user']
+        author = User.objects.annotate(
+            count=Count('recipes')
+        ).order_by('-count', 'pk').first()
+        recipe = Recipie.objects.annotate(
+            count=Count('favorite')
+        ).order_by('-count', 'pk').first()
+        return {
+            'follower': follower,
+            'buyer': User.objects.get(pk=buyer),
+            'author_id': author.pk,
+            'recipe_id': recipe.pk,
+            'short_link': recipe.get_short_link(),
+        }
+
+
+@pytest.fixture
+def benchmark_rounds(request):
+    return request.config.getoption('--benchmark-rounds')
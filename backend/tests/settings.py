@@ -0,0 +1,8 @@
+"""Настройки для тестов: значения, без которых проект не запускается."""
+import os
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('CSRF_TRUSTED_ORIGINS', 'http://localhost')
+os.environ.setdefault('SHORT_LINK_KEY', 'test-short-link-key')
+
+from foodgram.settings import *  # noqa: E402,F401,F403
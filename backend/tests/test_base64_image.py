@@ -0,0 +1,82 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from rest_framework import serializers
+
+from api import fields
+from api.fields import Base64ImageField
+from foodgram.constants import (ERROR_IMAGE_TOO_LARGE,
+                                ERROR_IMAGE_TOO_MANY_PIXELS, ERROR_IMAGE_TYPE,
+                                ERROR_INVALID_IMAGE)
+
+
+def get_image_bytes(image_format='PNG', size=(64, 48)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (10, 200, 30)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def encode(content, content_type='image/png'):
+    encoded = base64.b64encode(content).decode()
+    return f'data:{content_type};base64,{encoded}'
+
+
+def get_error(data):
+    with pytest.raises(serializers.ValidationError) as error:
+        Base64ImageField().to_internal_value(data)
+    return error.value.detail
+
+
+@pytest.mark.parametrize('image_format, extension', (
+    ('PNG', 'png'), ('JPEG', 'jpg'), ('GIF', 'gif'), ('WEBP', 'webp'),
+))
+def test_decodes_supported_types(image_format, extension):
+    content = get_image_bytes(image_format)
+    file = Base64ImageField().to_internal_value(encode(content))
+    assert file.name.endswith(f'.{extension}')
+    assert file.size == len(content)
+    assert file.read() == content
+
+
+def test_decodes_across_chunks_with_line_breaks(monkeypatch):
+    # Куски не кратны 4 символам, а переносы строк разбивают группы.
+    monkeypatch.setattr(fields, 'BASE64_CHUNK_SIZE', 37)
+    content = get_image_bytes(size=(300, 200))
+    encoded = base64.b64encode(content).decode()
+    data = '\n'.join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+    file = Base64ImageField().to_internal_value(data)
+    assert file.read() == content
+
+
+def test_rejects_too_large(monkeypatch):
+    content = get_image_bytes()
+    monkeypatch.setattr(fields, 'MAX_IMAGE_SIZE', len(content) - 1)
+    assert get_error(encode(content)) == [ERROR_IMAGE_TOO_LARGE]
+
+
+def test_rejects_too_many_pixels(monkeypatch):
+    monkeypatch.setattr(fields, 'MAX_IMAGE_PIXELS', 64 * 48 - 1)
+    assert get_error(encode(get_image_bytes())) == [
+        ERROR_IMAGE_TOO_MANY_PIXELS
+    ]
+
+
+@pytest.mark.parametrize('content', (
+    b'%PDF-1.4 not an image',
+    b'<svg xmlns="http://www.w3.org/2000/svg"></svg>',
+), ids=('pdf', 'svg'))
+def test_rejects_unknown_signature(content):
+    assert get_error(encode(content)) == [ERROR_IMAGE_TYPE]
+
+
+@pytest.mark.parametrize('data', (
+    'data:image/png;base64,!!!!',
+    'data:image/png;base64,iVBORw0KGgoA',
+    'data:image/png;base64,',
+    encode(b'\x89PNG\r\n\x1a\n' + b'broken'),
+    None,
+), ids=('bad_chars', 'truncated', 'empty', 'broken_png', 'not_string'))
+def test_rejects_invalid_data(data):
+    assert get_error(data) == [ERROR_INVALID_IMAGE]
@@ -0,0 +1,99 @@
+"""Замеры задержек и бюджеты SQL-запросов горячих эндпоинтов.
+
+У каждого эндпоинта два бюджета: для первого запроса после очистки кеша
+и для последующих. Превышение любого роняет прогон, а задержки пишутся
+в JSON (--benchmark-json) для сравнения прогонов между собой.
+"""
+import statistics
+import time
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tests.conftest import benchmark_results
+
+# (название, чей запрос, URL, (бюджет с пустым кешем, с прогретым)).
+# Первый запрос к справочнику в процессе загружает его вместе с версией
+# (ProcessLocalIndex): у recipes — теги, у ingredient_search — ингредиенты.
+CASES = (
+    ('recipes', None, '/api/recipes/', (6, 2)),
+    ('recipes_auth', 'follower', '/api/recipes/', (5, 3)),
+    ('recipes_keyset', 'follower', '/api/recipes/?cursor=', (5, 3)),
+    ('recipes_tags', None,
+     '/api/recipes/?tags=breakfast&tags=dinner', (4, 2)),
+    ('recipes_author', None, '/api/recipes/?author={author_id}', (5, 3)),
+    ('recipes_favorited', 'follower', '/api/recipes/?is_favorited=1',
+     (5, 3)),
+    ('recipes_in_cart', 'buyer', '/api/recipes/?is_in_shopping_cart=1',
+     (5, 3)),
+    ('recipe_detail', None, '/api/recipes/{recipe_id}/', (3, 1)),
+    ('recipe_detail_auth', 'follower', '/api/recipes/{recipe_id}/', (4, 2)),
+    ('subscriptions', 'follower',
+     '/api/users/subscriptions/?recipes_limit=3', (4, 4)),
+    ('download_shopping_cart', 'buyer',
+     '/api/recipes/download_shopping_cart/', (1, 1)),
+    ('download_shopping_cart_csv', 'buyer',
+     '/api/recipes/download_shopping_cart/?format=csv', (1, 1)),
+    ('ingredient_search', None, '/api/ingredients/?name=мук', (2, 0)),
+    ('short_link_redirect', None, '/s/{short_link}', (1, 1)),
+)
+
+
+def percentile(values, percent):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[
+        percent - 1
+    ]
+
+
+def measure(client, url, rounds):
+    timings = []
+    queries = []
+    for _ in range(rounds):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append(time.perf_counter() - started)
+        queries.append(len(context.captured_queries))
+        assert response.status_code in (200, 302), response
+    return timings, queries
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'name, user, url, budget', CASES, ids=[case[0] for case in CASES]
+)
+def test_endpoint_budget(name, user, url, budget, dataset, benchmark_rounds):
+    client = APIClient()
+    if user:
+        client.force_authenticate(dataset[user])
+    url = url.format(**dataset)
+    cache.clear()
+    timings, queries = measure(client, url, benchmark_rounds)
+    milliseconds = [timing * 1000 for timing in timings]
+    cold_budget, warm_budget = budget
+    benchmark_results.append({
+        'name': name,
+        'url': url,
+        'budget_cold': cold_budget,
+        'budget_warm': warm_budget,
+        'queries_cold': queries[0],
+        'queries_warm': max(queries[1:], default=0),
+        'p50_ms': round(percentile(milliseconds, 50), 3),
+        'p95_ms': round(percentile(milliseconds, 95), 3),
+        'p99_ms': round(percentile(milliseconds, 99), 3),
+        'mean_ms': round(statistics.fmean(milliseconds), 3),
+    })
+    assert queries[0] <= cold_budget, (
+        f'{name}: {queries[0]} SQL-запросов с пустым кешем '
+        f'при бюджете {cold_budget}'
+    )
+    assert max(queries[1:], default=0) <= warm_budget, (
+        f'{name}: до {max(queries[1:])} SQL-запросов с прогретым кешем '
+        f'при бюджете {warm_budget} ({queries})'
+    )
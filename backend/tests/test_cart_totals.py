@@ -0,0 +1,137 @@
+import pytest
+from django.db.models import Count
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipie, ShoppingCart, ShoppingCartTotal
+from recipes.services import calculate_cart_totals
+
+
+def get_stored_totals(user_id):
+    return {
+        (user_id, ingredient_id): amount
+        for ingredient_id, amount in ShoppingCartTotal.objects.filter(
+            user_id=user_id
+        ).values_list('ingredient_id', 'amount')
+    }
+
+
+def assert_totals_match(user_id):
+    assert get_stored_totals(user_id) == calculate_cart_totals((user_id,))
+
+
+def get_new_recipe_ids(user_id, count):
+    return list(Recipie.objects.exclude(
+        shoppingcart__user_id=user_id
+    ).filter(recipe_ingredients__isnull=False).distinct().order_by(
+        'pk'
+    ).values_list('pk', flat=True)[:count])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('option', ('ignore_conflicts', 'update_conflicts'))
+def test_bulk_create_rejects_conflict_options(dataset, option):
+    user_id = dataset['buyer'].pk
+    recipe_id = ShoppingCart.objects.filter(
+        user_id=user_id
+    ).values_list('recipe_id', flat=True).first()
+    with pytest.raises(ValueError):
+        ShoppingCart.objects.bulk_create(
+            (ShoppingCart(user_id=user_id, recipe_id=recipe_id),),
+            **{option: True}
+        )
+    assert_totals_match(user_id)
+
+
+@pytest.mark.django_db
+def test_insert_or_ignore_many_counts_only_inserted(dataset):
+    user_id = dataset['buyer'].pk
+    existing = list(ShoppingCart.objects.filter(
+        user_id=user_id
+    ).values_list('recipe_id', flat=True)[:2])
+    new = get_new_recipe_ids(user_id, 2)
+    inserted = ShoppingCart.objects.insert_or_ignore_many(
+        user_id, existing + new
+    )
+    assert sorted(inserted) == sorted(new)
+    assert_totals_match(user_id)
+
+
+def get_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def get_cart_users(recipe_id):
+    return list(ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True))
+
+
+@pytest.fixture
+def cart_recipe(dataset):
+    """Рецепт из корзины покупателя, у которого несколько ингредиентов."""
+    return Recipie.objects.filter(
+        shoppingcart__user=dataset['buyer']
+    ).annotate(
+        ingredient_count=Count('recipe_ingredients')
+    ).filter(ingredient_count__gte=2).order_by('pk').first()
+
+
+@pytest.mark.django_db
+def test_add_and_remove_keep_totals(dataset):
+    user = dataset['buyer']
+    client = get_client(user)
+    recipe_id, = get_new_recipe_ids(user.pk, 1)
+    response = client.post(f'/api/recipes/{recipe_id}/shopping_cart/')
+    assert response.status_code == 201, response.content
+    assert_totals_match(user.pk)
+    response = client.delete(f'/api/recipes/{recipe_id}/shopping_cart/')
+    assert response.status_code == 204
+    assert_totals_match(user.pk)
+
+
+@pytest.mark.django_db
+def test_recipe_edit_updates_totals(cart_recipe):
+    recipe_ingredients = list(cart_recipe.recipe_ingredients.order_by('pk'))
+    changed, removed = recipe_ingredients[:2]
+    kept = recipe_ingredients[2:]
+    added = Ingredient.objects.exclude(
+        pk__in=[item.ingredient_id for item in recipe_ingredients]
+    ).order_by('pk').first()
+    response = get_client(cart_recipe.author).patch(
+        f'/api/recipes/{cart_recipe.pk}/', {
+            'tags': list(cart_recipe.tags.values_list('pk', flat=True)),
+            'ingredients': [
+                {'id': changed.ingredient_id, 'amount': changed.amount + 7},
+                {'id': added.pk, 'amount': 3},
+                *({'id': item.ingredient_id, 'amount': item.amount}
+                  for item in kept),
+            ],
+        }, format='json'
+    )
+    assert response.status_code == 200, response.content
+    for user_id in get_cart_users(cart_recipe.pk):
+        assert_totals_match(user_id)
+    # Состав обновляется по отличиям: неизменённые строки остаются.
+    current = {
+        item.ingredient_id: item
+        for item in cart_recipe.recipe_ingredients.all()
+    }
+    assert removed.ingredient_id not in current
+    assert current[changed.ingredient_id].pk == changed.pk
+    assert current[changed.ingredient_id].amount == changed.amount + 7
+    assert current[added.pk].amount == 3
+    for item in kept:
+        assert current[item.ingredient_id].pk == item.pk
+
+
+@pytest.mark.django_db
+def test_recipe_delete_updates_totals(cart_recipe):
+    user_ids = get_cart_users(cart_recipe.pk)
+    response = get_client(cart_recipe.author).delete(
+        f'/api/recipes/{cart_recipe.pk}/'
+    )
+    assert response.status_code == 204
+    for user_id in user_ids:
+        assert_totals_match(user_id)
@@ -0,0 +1,89 @@
+import base64
+from io import BytesIO
+
+import pytest
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipie, Tag
+from users.models import User
+
+
+def get_image_data(size=(800, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (120, 80, 40)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@pytest.fixture
+def author(dataset):
+    return User.objects.get(pk=dataset['author_id'])
+
+
+@pytest.fixture
+def client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+def create_recipe(client):
+    return client.post('/api/recipes/', {
+        'name': 'Картинка',
+        'text': 'Описание',
+        'cooking_time': 5,
+        'image': get_image_data(),
+        'tags': [Tag.objects.values_list('pk', flat=True).first()],
+        'ingredients': [{
+            'id': Ingredient.objects.values_list('pk', flat=True).first(),
+            'amount': 1,
+        }],
+    }, format='json')
+
+
+@pytest.mark.django_db
+def test_original_until_derivatives_exist(client):
+    response = create_recipe(client)
+    assert response.status_code == 201, response.content
+    recipe = Recipie.objects.get(pk=response.json()['id'])
+    data = client.get(f'/api/recipes/{recipe.pk}/').json()
+    assert data['image'].endswith(recipe.image.url)
+    assert data['image_webp'] is None
+
+
+@pytest.mark.django_db
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+def test_recipe_derivatives(client, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        response = create_recipe(client)
+    assert response.status_code == 201, response.content
+    recipe = Recipie.objects.get(pk=response.json()['id'])
+    assert recipe.image_derivatives == recipe.image.name
+    data = client.get(f'/api/recipes/{recipe.pk}/').json()
+    assert data['image'].endswith('.card.jpg')
+    assert data['image_webp'].endswith('.card.webp')
+    storage = recipe.image.storage
+    for url in (data['image'], data['image_webp']):
+        name = url.split(storage.base_url, 1)[1]
+        with storage.open(name) as file, Image.open(file) as image:
+            assert max(image.size) == 720
+
+
+@pytest.mark.django_db
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+def test_avatar_stays_original(client, author,
+                               django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.put(
+            '/api/users/me/avatar/', {'avatar': get_image_data()},
+            format='json'
+        )
+    assert response.status_code == 200, response.content
+    # force_authenticate подставляет тот же объект, что и при загрузке.
+    author.refresh_from_db()
+    data = client.get('/api/users/me/').json()
+    assert data['avatar'].endswith(author.avatar.url)
+    assert data['avatar_thumbnail'].endswith('.thumb.jpg')
+    assert data['avatar_thumbnail_webp'].endswith('.thumb.webp')
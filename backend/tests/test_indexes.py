@@ -0,0 +1,53 @@
+import pytest
+from django.db import IntegrityError, transaction
+
+from recipes.management.commands.explain_queries import (INDEX_SCAN_PATTERNS,
+                                                         PLAN_NODE_SEPARATORS,
+                                                         SEQ_SCAN_PATTERNS,
+                                                         Command)
+from recipes.models import RecipeIngredient
+
+POSTGRESQL_PLAN = '''Limit  (cost=0.56..12.40 rows=6 width=120)
+  ->  Nested Loop Semi Join  (cost=0.56..5921.10 rows=3000 width=120)
+        ->  Index Scan using recipe_pub_date_idx on recipes_recipie
+              Filter: (tags_mask & 1) <> 0
+        ->  Index Only Scan using unique_favorite on recipes_favorite u0
+              Index Cond: ((user_id = 1) AND (recipe_id = recipes_recipie.id))
+'''
+SQLITE_PLAN = '''6 0 0 SCAN recipes_recipie USING INDEX recipe_pub_date_idx
+9 0 0 SEARCH users_user USING INTEGER PRIMARY KEY (rowid=?)
+32 24 0 SEARCH U0 USING COVERING INDEX favorite_1 (user_id=? AND recipe_id=?)
+40 0 0 SCAN recipes_tag USING COVERING INDEX tag_slug_idx
+50 0 0 SCAN recipes_ingredient
+'''
+
+
+def find_tables(patterns, vendor, plan):
+    return Command.find_tables(
+        patterns[vendor], PLAN_NODE_SEPARATORS[vendor].split(plan), set()
+    )
+
+
+@pytest.mark.parametrize('vendor, plan, tables', (
+    ('postgresql', POSTGRESQL_PLAN, ['recipes_recipie']),
+    ('sqlite', SQLITE_PLAN, ['recipes_recipie', 'recipes_tag']),
+))
+def test_full_index_scans_are_flagged(vendor, plan, tables):
+    assert find_tables(INDEX_SCAN_PATTERNS, vendor, plan) == tables
+
+
+def test_sqlite_index_scan_is_not_sequential():
+    assert Command.find_tables(
+        SEQ_SCAN_PATTERNS['sqlite'], SQLITE_PLAN.splitlines(), set()
+    ) == ['recipes_ingredient']
+
+
+@pytest.mark.django_db
+def test_covering_constraint_keeps_uniqueness(dataset):
+    recipe_ingredient = RecipeIngredient.objects.order_by('pk').first()
+    with pytest.raises(IntegrityError), transaction.atomic():
+        RecipeIngredient.objects.create(
+            recipe_id=recipe_ingredient.recipe_id,
+            ingredient_id=recipe_ingredient.ingredient_id,
+            amount=recipe_ingredient.amount + 1
+        )
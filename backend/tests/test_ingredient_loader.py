@@ -0,0 +1,111 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from foodgram.constants import MAX_INGRIDIENT_NAME_LENGTH
+from recipes.ingredient_loader import load_ingredients, read_csv, read_json
+from recipes.models import Ingredient, RecipeIngredient, Recipie
+
+USE_COPY = (
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(
+        connection.vendor != 'postgresql',
+        reason='COPY есть только в PostgreSQL'
+    )),
+)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('use_copy', USE_COPY)
+def test_load_inserts_updates_and_skips(use_copy):
+    existing = Ingredient.objects.order_by('pk').first()
+    rows = read_csv(io.StringIO(
+        'тестовая соль,г\n'
+        'тестовый перец,г\n'
+        'тестовый перец,щепотка\n'
+        f'{existing.name},новая единица\n'
+        'без единицы\n'
+        ',г\n'
+        f'{"x" * (MAX_INGRIDIENT_NAME_LENGTH + 1)},г\n'
+        'лишняя,колонка,здесь\n'
+    ))
+    stats = load_ingredients(rows, batch_size=10, use_copy=use_copy)
+    assert stats == {'read': 8, 'inserted': 2, 'updated': 1, 'skipped': 5}
+    assert dict(Ingredient.objects.filter(
+        name__startswith='тестов'
+    ).values_list('name', 'measurement_unit')) == {
+        'тестовая соль': 'г', 'тестовый перец': 'щепотка'
+    }
+    existing.refresh_from_db()
+    assert existing.measurement_unit == 'новая единица'
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('use_copy', USE_COPY)
+def test_last_duplicate_wins_across_batches(use_copy):
+    rows = read_csv(io.StringIO(
+        'тестовый перец,г\nтестовая соль,г\nтестовый перец,щепотка\n'
+    ))
+    load_ingredients(rows, batch_size=1, use_copy=use_copy)
+    assert Ingredient.objects.get(
+        name='тестовый перец'
+    ).measurement_unit == 'щепотка'
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('use_copy', USE_COPY)
+def test_reload_is_idempotent(use_copy):
+    content = 'тестовая соль,г\nтестовый перец,г\n'
+    load_ingredients(read_csv(io.StringIO(content)), 10, use_copy)
+    stats = load_ingredients(read_csv(io.StringIO(content)), 10, use_copy)
+    assert stats == {'read': 2, 'inserted': 0, 'updated': 0, 'skipped': 2}
+
+
+@pytest.mark.django_db
+def test_updated_unit_touches_recipes():
+    recipe_ingredient = RecipeIngredient.objects.select_related(
+        'ingredient', 'recipe'
+    ).order_by('pk').first()
+    ingredient = recipe_ingredient.ingredient
+    load_ingredients(read_csv(io.StringIO(
+        f'{ingredient.name},другая единица\n'
+    )), 10, use_copy=False)
+    assert Recipie.objects.get(
+        pk=recipe_ingredient.recipe_id
+    ).updated_at > recipe_ingredient.recipe.updated_at
+
+
+def test_read_json_streams_items():
+    items = [
+        {'name': f'ингредиент {number}', 'measurement_unit': 'г'}
+        for number in range(20)
+    ]
+    content = json.dumps([items[0], 'не объект', *items[1:]], indent=2)
+    rows = list(read_json(io.StringIO(content), chunk_size=7))
+    assert rows[1] is None
+    assert [row for row in rows if row] == [
+        (item['name'], item['measurement_unit']) for item in items
+    ]
+
+
+@pytest.mark.parametrize('content', (
+    '{"name": "соль"}', '[{"name": "соль", "measurement_unit": "г"}',
+), ids=('not_array', 'not_closed'))
+def test_read_json_rejects_malformed(content):
+    with pytest.raises(ValueError):
+        list(read_json(io.StringIO(content), chunk_size=4))
+
+
+@pytest.mark.django_db
+def test_fill_db_reads_json(tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps([
+        {'name': 'тестовый шафран', 'measurement_unit': 'г'},
+    ]), encoding='utf-8')
+    call_command('fill_db', str(path), '--batch-size', '1')
+    assert Ingredient.objects.filter(
+        name='тестовый шафран', measurement_unit='г'
+    ).exists()
@@ -0,0 +1,42 @@
+import json
+from base64 import urlsafe_b64encode
+
+import pytest
+from rest_framework.test import APIClient
+
+from foodgram.constants import ERROR_INVALID_CURSOR
+
+
+def encode(token):
+    return urlsafe_b64encode(json.dumps(token).encode()).decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('cursor', (
+    encode({'p': ['abc', 1], 'r': 0}),
+    encode({'p': ['2024-01-01T00:00:00+00:00', 'x'], 'r': 0}),
+    encode({'p': [None, None], 'r': 0}),
+    encode({'p': ['2024-01-01T00:00:00+00:00', 10 ** 30], 'r': 0}),
+    encode({'p': [True, {}], 'r': 1}),
+    encode({'p': 'abc', 'r': 0}),
+    encode(['abc']),
+    'not-base64!',
+), ids=(
+    'bad_date', 'bad_id', 'nulls', 'id_overflow', 'wrong_types',
+    'not_list', 'not_object', 'garbage'
+))
+def test_invalid_cursor_is_not_found(cursor):
+    response = APIClient().get('/api/recipes/', {'cursor': cursor})
+    assert response.status_code == 404, response.content
+    assert response.json() == {'detail': ERROR_INVALID_CURSOR}
+
+
+@pytest.mark.django_db
+def test_cursor_round_trip():
+    client = APIClient()
+    first = client.get('/api/recipes/', {'cursor': '', 'limit': 2}).json()
+    second = client.get(first['next']).json()
+    assert second['results']
+    assert not {recipe['id'] for recipe in first['results']} & {
+        recipe['id'] for recipe in second['results']
+    }
@@ -0,0 +1,145 @@
+import pytest
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from tests.test_cart_totals import assert_totals_match, get_new_recipe_ids
+
+from foodgram.constants import (ERROR_ALREADY_SUBSCRIBED,
+                                ERROR_RECIPE_NOT_FOUND, ERROR_RELATION_EXISTS,
+                                ERROR_RELATION_NOT_FOUND,
+                                ERROR_SELF_SUBSCRIPTION, ERROR_USER_NOT_FOUND)
+from recipes.models import Favorite, Recipie, ShoppingCart
+from users.models import Subscription, User
+
+MISSING_ID = 10 ** 9
+
+
+@pytest.fixture
+def user(dataset):
+    return dataset['buyer']
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def get_errors(response):
+    return response.json()[api_settings.NON_FIELD_ERRORS_KEY]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url, model', (
+    ('/api/recipes/{}/favorite/', Favorite),
+    ('/api/recipes/{}/shopping_cart/', ShoppingCart),
+))
+def test_duplicate_recipe_relation_is_bad_request(client, user, url, model):
+    recipe_id = Recipie.objects.exclude(favorite__user=user).exclude(
+        shoppingcart__user=user
+    ).values_list('pk', flat=True).first()
+    assert client.post(url.format(recipe_id)).status_code == 201
+    response = client.post(url.format(recipe_id))
+    assert response.status_code == 400
+    assert get_errors(response) == [
+        ERROR_RELATION_EXISTS.format(model._meta.verbose_name)
+    ]
+    assert model.objects.filter(user=user, recipe_id=recipe_id).count() == 1
+    assert_totals_match(user.pk)
+
+
+@pytest.mark.django_db
+def test_duplicate_subscription_is_bad_request(client, user):
+    author = User.objects.exclude(pk=user.pk).exclude(
+        subscriptions_to_author__user=user
+    ).order_by('pk').first()
+    url = f'/api/users/{author.pk}/subscribe/'
+    assert client.post(url).status_code == 201
+    response = client.post(url)
+    assert response.status_code == 400
+    assert get_errors(response) == [ERROR_ALREADY_SUBSCRIBED]
+    response = client.post(f'/api/users/{user.pk}/subscribe/')
+    assert response.status_code == 400
+    assert get_errors(response) == [ERROR_SELF_SUBSCRIPTION]
+
+
+@pytest.mark.django_db
+def test_bulk_shopping_cart(client, user):
+    existing = ShoppingCart.objects.filter(
+        user=user
+    ).values_list('recipe_id', flat=True).first()
+    new = get_new_recipe_ids(user.pk, 2)
+    ids = [new[0], existing, MISSING_ID, new[1], new[0]]
+    response = client.post(
+        '/api/recipes/shopping_cart/bulk/', {'ids': ids}, format='json'
+    )
+    assert response.status_code == 200, response.content
+    exists_error = ERROR_RELATION_EXISTS.format(
+        ShoppingCart._meta.verbose_name
+    )
+    assert response.json()['results'] == [
+        {'id': new[0], 'status': 'created'},
+        {'id': existing, 'status': 'error', 'error': exists_error},
+        {'id': MISSING_ID, 'status': 'error',
+         'error': ERROR_RECIPE_NOT_FOUND},
+        {'id': new[1], 'status': 'created'},
+    ]
+    assert_totals_match(user.pk)
+
+    response = client.delete(
+        '/api/recipes/shopping_cart/bulk/', {'ids': [new[1], MISSING_ID]},
+        format='json'
+    )
+    assert response.status_code == 200
+    assert response.json()['results'] == [
+        {'id': new[1], 'status': 'deleted'},
+        {'id': MISSING_ID, 'status': 'error',
+         'error': ERROR_RELATION_NOT_FOUND.format(
+             ShoppingCart._meta.verbose_name
+         )},
+    ]
+    assert not ShoppingCart.objects.filter(user=user, recipe_id=new[1])
+    assert_totals_match(user.pk)
+
+
+@pytest.mark.django_db
+def test_bulk_favorite(client, user):
+    recipe_id = Recipie.objects.exclude(
+        favorite__user=user
+    ).values_list('pk', flat=True).first()
+    response = client.post(
+        '/api/recipes/favorite/bulk/', {'ids': [recipe_id, MISSING_ID]},
+        format='json'
+    )
+    assert response.status_code == 200
+    assert [item['status'] for item in response.json()['results']] == [
+        'created', 'error'
+    ]
+    assert Favorite.objects.filter(user=user, recipe_id=recipe_id).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_subscribe(client, user):
+    author_id = User.objects.exclude(pk=user.pk).exclude(
+        subscriptions_to_author__user=user
+    ).values_list('pk', flat=True).first()
+    response = client.post(
+        '/api/users/subscribe/bulk/',
+        {'ids': [author_id, user.pk, MISSING_ID]}, format='json'
+    )
+    assert response.status_code == 200
+    assert response.json()['results'] == [
+        {'id': author_id, 'status': 'created'},
+        {'id': user.pk, 'status': 'error', 'error': ERROR_SELF_SUBSCRIPTION},
+        {'id': MISSING_ID, 'status': 'error', 'error': ERROR_USER_NOT_FOUND},
+    ]
+    assert Subscription.objects.filter(user=user, author_id=author_id)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ids', ([], [0], ['x'], list(range(1, 102))))
+def test_bulk_rejects_invalid_ids(client, ids):
+    response = client.post(
+        '/api/recipes/favorite/bulk/', {'ids': ids}, format='json'
+    )
+    assert response.status_code == 400
@@ -0,0 +1,44 @@
+import pytest
+
+from recipes.models import IndexVersion, Ingredient
+from recipes.search import IngredientIndex, ProcessLocalIndex, indexes
+
+
+@pytest.fixture
+def index():
+    index = IngredientIndex()
+    yield index
+    indexes.remove(index)
+
+
+def test_base_index_is_abstract():
+    with pytest.raises(TypeError):
+        ProcessLocalIndex()
+
+
+@pytest.mark.django_db
+def test_loaded_index_does_not_query(index, django_assert_num_queries):
+    index.get_entries()
+    with django_assert_num_queries(0):
+        assert index.search('мука')
+
+
+@pytest.mark.django_db
+def test_refresh_reloads_only_on_version_change(
+    index, django_assert_num_queries
+):
+    index.get_entries()
+    with django_assert_num_queries(1):
+        index.refresh()
+    # Ингредиент и новая версия — как будто их записал другой процесс.
+    Ingredient.objects.bulk_create((
+        Ingredient(name='тестовый кардамон', measurement_unit='г'),
+    ))
+    assert not index.search('тестовый кардамон')
+    IndexVersion.objects.update_or_create(
+        name=index.version_key, defaults={'version': 10 ** 6}
+    )
+    index.refresh()
+    assert [ingredient.name for ingredient in index.search(
+        'тестовый кардамон'
+    )] == ['тестовый кардамон']
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+import re
+import zlib
+from pathlib import Path
+
+import pytest
+from django.conf import settings
+from fontTools.ttLib import TTFont
+from rest_framework.test import APIClient
+from tests.test_cart_totals import get_client
+
+from api.pdf import PDFWriter
+from recipes.models import ShoppingCartTotal
+
+URL = '/api/recipes/download_shopping_cart/'
+FONT_FILE_PATTERN = re.compile(
+    rb'/Length (\d+) /Length1 (\d+) /Filter /FlateDecode >>\nstream\n'
+)
+
+
+def get_content(response):
+    return b''.join(response.streaming_content)
+
+
+def get_totals(user):
+    return list(ShoppingCartTotal.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit', 'amount'
+    ).order_by('ingredient__name'))
+
+
+def get_font(content):
+    match = FONT_FILE_PATTERN.search(content)
+    start = match.end()
+    data = zlib.decompress(content[start:start + int(match[1])])
+    assert len(data) == int(match[2])
+    return TTFont(io.BytesIO(data))
+
+
+@pytest.mark.django_db
+def test_text_csv_and_json_formats(dataset):
+    user = dataset['buyer']
+    totals = get_totals(user)
+    assert totals
+    client = get_client(user)
+
+    response = client.get(URL, {'format': 'txt'})
+    assert response['Content-Type'] == 'text/plain; charset=utf-8'
+    assert get_content(response).decode().splitlines() == [
+        f'{name} ({unit}) - {amount}' for name, unit, amount in totals
+    ]
+
+    response = client.get(URL, {'format': 'csv'})
+    rows = list(csv.reader(io.StringIO(get_content(response).decode())))
+    assert rows[1:] == [
+        [name, unit, str(amount)] for name, unit, amount in totals
+    ]
+
+    response = client.get(URL, {'format': 'json'})
+    assert json.loads(get_content(response)) == [
+        {'name': name, 'measurement_unit': unit, 'amount': amount}
+        for name, unit, amount in totals
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('file_format', ('txt', 'csv', 'pdf'))
+def test_errors_are_json(file_format):
+    response = APIClient().get(URL, {'format': file_format})
+    assert response.status_code == 401
+    assert response['Content-Type'] == 'application/json'
+    assert 'detail' in response.json()
+
+
+@pytest.mark.django_db
+def test_unknown_format_error_is_json(dataset):
+    response = get_client(dataset['buyer']).get(URL, {'format': 'xml'})
+    assert response.status_code == 404
+    assert response['Content-Type'] == 'application/json'
+
+
+@pytest.mark.skipif(
+    not Path(settings.SHOPPING_LIST_PDF_FONT).is_file(),
+    reason='Нет шрифта для PDF'
+)
+def test_pdf_embeds_only_used_glyphs():
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    content = b''.join(PDFWriter().stream(
+        ['Соль (г) - 5'], font_path=font_path
+    ))
+    assert content.startswith(b'%PDF-1.4')
+    assert re.search(rb'/BaseFont /[A-Z]{6}\+DejaVuSans ', content)
+    assert len(content) < Path(font_path).stat().st_size // 10
+    cmap = get_font(content).getBestCmap()
+    assert set(map(chr, cmap)) == set('Соль (г) - 5')
@@ -0,0 +1,67 @@
+import pytest
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from foodgram.constants import (RECIPE_FRONTEND_URL, SHORT_LINK_ALPHABET,
+                                SHORT_LINK_HALF_BITS, SHORT_LINK_LENGTH)
+from recipes.models import Recipie
+from recipes.services import decode_short_link, encode_short_link
+
+MAX_PK = (1 << 2 * SHORT_LINK_HALF_BITS) - 1
+
+
+def test_encode_decode_is_bijection():
+    pks = [*range(1, 20001), MAX_PK - 1, MAX_PK]
+    links = [encode_short_link(pk) for pk in pks]
+    assert len(set(links)) == len(links)
+    for pk, link in zip(pks, links):
+        assert len(link) == SHORT_LINK_LENGTH
+        assert set(link) <= set(SHORT_LINK_ALPHABET)
+        assert decode_short_link(link) == pk
+
+
+@pytest.mark.parametrize('pk', (0, -1, MAX_PK + 1))
+def test_encode_rejects_out_of_range(pk):
+    with pytest.raises(ValueError):
+        encode_short_link(pk)
+
+
+@pytest.mark.parametrize('link', (
+    '', 'abc', 'abcdefgh', 'abc-def', 'ZZZZZZZ'
+), ids=('empty', 'short', 'long', 'foreign_char', 'out_of_range'))
+def test_decode_rejects_foreign_strings(link):
+    assert decode_short_link(link) is None
+
+
+def test_links_depend_on_key():
+    links = [encode_short_link(pk) for pk in range(1, 101)]
+    with override_settings(SHORT_LINK_KEY='another-key'):
+        assert [encode_short_link(pk) for pk in range(1, 101)] != links
+
+
+@pytest.mark.django_db
+def test_redirect_by_encoded_link(dataset):
+    recipe_id = dataset['recipe_id']
+    client = APIClient()
+    link = client.get(f'/api/recipes/{recipe_id}/get-link/').json()[
+        'short-link'
+    ]
+    assert link.endswith(f'/s/{encode_short_link(recipe_id)}')
+    response = client.get(link)
+    assert response.status_code == 302
+    assert response['Location'].endswith(RECIPE_FRONTEND_URL.format(recipe_id))
+
+
+@pytest.mark.django_db
+def test_legacy_short_link_fallback(dataset):
+    recipe_id = dataset['recipe_id']
+    Recipie.objects.filter(pk=recipe_id).update(short_link='legacy')
+    client = APIClient()
+    link = client.get(f'/api/recipes/{recipe_id}/get-link/').json()[
+        'short-link'
+    ]
+    assert link.endswith('/s/legacy')
+    response = client.get('/s/legacy')
+    assert response.status_code == 302
+    assert response['Location'].endswith(RECIPE_FRONTEND_URL.format(recipe_id))
+    assert client.get('/s/unknown').status_code == 404
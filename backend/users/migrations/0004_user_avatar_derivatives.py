@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_subscription_author_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_derivatives',
+            field=models.CharField(blank=True, editable=False, help_text='Имя аватара, для которого созданы уменьшенные копии', max_length=100, verbose_name='Аватар с готовыми копиями'),
+        ),
+    ]
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
-from foodgram.constants import MAX_EMAIL_LENGTH, MAX_NAME_FIELDS_LENTGH
+from foodgram.constants import (MAX_EMAIL_LENGTH, MAX_IMAGE_NAME_LENGTH,
+                                MAX_NAME_FIELDS_LENTGH)
 from users.validators import validate_username
 
 
@@ -15,6 +16,13 @@ class User(AbstractUser):
         default=None,
         help_text='Фотография профиля пользователя',
     )
+    avatar_derivatives = models.CharField(
+        'Аватар с готовыми копиями',
+        max_length=MAX_IMAGE_NAME_LENGTH,
+        blank=True,
+        editable=False,
+        help_text='Имя аватара, для которого созданы уменьшенные копии',
+    )
     email = models.EmailField(
         'Email',
         max_length=MAX_EMAIL_LENGTH,
@@ -36,6 +44,10 @@ class User(AbstractUser):
         'Фамилия',
         max_length=MAX_NAME_FIELDS_LENTGH,
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
 
     class Meta:
         ordering = ('last_name',)
@@ -51,16 +63,26 @@ class Subscription(models.Model):
         User,
         on_delete=models.CASCADE,
         verbose_name='Подписки пользователя',
-        related_name='user_subscriptions'
+        related_name='user_subscriptions',
+        db_index=False
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Подписки на автора',
-        related_name='subscriptions_to_author'
+        related_name='subscriptions_to_author',
+        db_index=False
     )
 
     class Meta:
+        # Подписки пользователя ищут через уникальное ограничение
+        # (user, author), подписчиков автора — через этот индекс.
+        indexes = (
+            models.Index(
+                fields=('author', 'user'),
+                name='subscription_author_user_idx'
+            ),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'author'),
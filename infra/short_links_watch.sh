@@ -0,0 +1,26 @@
+#!/bin/sh
+# Перезагружает nginx, когда бэкенд обновляет карту коротких ссылок.
+dir=/etc/nginx/short_links
+interval=${SHORT_LINK_MAP_WATCH_INTERVAL:-10}
+
+snapshot() {
+  stat -c '%n %Y %s' "$dir"/*.map 2>/dev/null | md5sum
+}
+
+(
+  last=$(snapshot)
+  while sleep "$interval"; do
+    current=$(snapshot)
+    if [ "$current" != "$last" ]; then
+      # Без проверки неудачный reload молча оставляет старую карту, а
+      # следующий запуск контейнера падает на той же конфигурации.
+      if nginx -t -q; then
+        nginx -s reload
+        last=$current
+      else
+        echo "short_links_watch: nginx -t отклонил карту коротких" \
+             "ссылок, перезагрузка пропущена" >&2
+      fi
+    fi
+  done
+) &